@@ -0,0 +1,65 @@
+"""task fire_at
+
+Колонка tasks.fire_at (момент отправки напоминания) с частичным индексом
+по неотправленным напоминаниям. fire_at заполняется для напоминаний,
+созданных до появления колонки: due_datetime здесь ещё строка, наивные
+даты считаются UTC, некорректные пропускаются.
+
+Revision ID: 1c5e8f2a7b93
+Revises: 9b1e0c6a4d21
+Create Date: 2026-10-18 11:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c5e8f2a7b93'
+down_revision: Union[str, Sequence[str], None] = '9b1e0c6a4d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {col["name"] for col in sa.inspect(op.get_bind()).get_columns("tasks")}
+    if "fire_at" not in columns:
+        op.add_column("tasks", sa.Column("fire_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_index(
+        "ix_tasks_fire_at_pending",
+        "tasks",
+        ["fire_at"],
+        postgresql_where=sa.text('fire_at IS NOT NULL AND "isReminded" = false'),
+        if_not_exists=True,
+    )
+
+    op.execute("SET TIME ZONE 'UTC'")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION pg_temp.try_timestamptz(value text)
+        RETURNS timestamptz AS $$
+        BEGIN
+            RETURN NULLIF(value, '')::timestamptz;
+        EXCEPTION WHEN others THEN
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE
+        """
+    )
+    op.execute(
+        """
+        UPDATE tasks
+        SET fire_at = GREATEST(pg_temp.try_timestamptz(due_datetime) - remind_at * interval '1 minute', now())
+        WHERE fire_at IS NULL AND remind_at IS NOT NULL AND "isReminded" = false
+          AND pg_temp.try_timestamptz(due_datetime) > now()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_tasks_fire_at_pending", table_name="tasks", if_exists=True)
+    op.drop_column("tasks", "fire_at")
@@ -0,0 +1,35 @@
+"""task reminder lease
+
+Аренда напоминания воркером: tasks.lease_owner и tasks.lease_expires_at.
+
+Revision ID: 2d7a4b9e6c18
+Revises: 1c5e8f2a7b93
+Create Date: 2026-10-18 11:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d7a4b9e6c18'
+down_revision: Union[str, Sequence[str], None] = '1c5e8f2a7b93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {col["name"] for col in sa.inspect(op.get_bind()).get_columns("tasks")}
+    if "lease_owner" not in columns:
+        op.add_column("tasks", sa.Column("lease_owner", sa.String(), nullable=True))
+    if "lease_expires_at" not in columns:
+        op.add_column("tasks", sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("tasks", "lease_expires_at")
+    op.drop_column("tasks", "lease_owner")
@@ -0,0 +1,143 @@
+"""timestamptz datetime columns
+
+Переводит строковые ISO-даты в timestamptz:
+tasks.due_datetime, events.start_datetime/end_datetime, users.google_token_expiry.
+
+Большие таблицы не блокируются надолго: для каждой колонки создаётся новая
+timestamptz-колонка, данные переносятся пачками по id с коммитом после каждой
+пачки. Затем в одной транзакции под блокировкой записи заново конвертируются
+строки, изменённые после своей пачки, и колонки меняются местами. Строки без
+смещения считаются UTC, некорректные значения становятся NULL. Прерванную
+миграцию можно просто запустить снова. Для списка задач по сроку создаётся
+индекс (user_id, due_datetime).
+
+Revision ID: 3f9c2a7d1b40
+Revises: 2d7a4b9e6c18
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d1b40'
+down_revision: Union[str, Sequence[str], None] = '2d7a4b9e6c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10_000
+
+COLUMNS = [
+    ("tasks", "due_datetime", True),
+    ("events", "start_datetime", False),
+    ("events", "end_datetime", False),
+    ("users", "google_token_expiry", True),
+]
+
+
+def _is_text_column(inspector, table: str, column: str) -> bool:
+    """Колонку нужно конвертировать, только если она ещё строковая."""
+    if not inspector.has_table(table):
+        return False
+    for col in inspector.get_columns(table):
+        if col["name"] == column:
+            return isinstance(col["type"], sa.String)
+    return False
+
+
+def _is_timestamp_column(inspector, table: str, column: str) -> bool:
+    """Обратно в строку переводим только то, что сейчас timestamptz."""
+    if not inspector.has_table(table):
+        return False
+    for col in inspector.get_columns(table):
+        if col["name"] == column:
+            return isinstance(col["type"], sa.DateTime)
+    return False
+
+
+def _has_column(inspector, table: str, column: str) -> bool:
+    return any(col["name"] == column for col in inspector.get_columns(table))
+
+
+def _backfill(conn, table: str, sql: str) -> None:
+    """Выполняет sql пачками по id; каждая пачка в своей транзакции."""
+    max_id = conn.execute(sa.text(f"SELECT max(id) FROM {table}")).scalar()
+    if max_id is None:
+        return
+    lo = 0
+    while lo < max_id:
+        hi = lo + BATCH_SIZE
+        with op.get_context().autocommit_block():
+            conn.execute(sa.text(sql), {"lo": lo, "hi": hi})
+        lo = hi
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    # Разбор с fallback в NULL для мусорных строк; наивные даты — UTC
+    op.execute("SET TIME ZONE 'UTC'")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION pg_temp.try_timestamptz(value text)
+        RETURNS timestamptz AS $$
+        BEGIN
+            RETURN NULLIF(value, '')::timestamptz;
+        EXCEPTION WHEN others THEN
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE
+        """
+    )
+
+    for table, column, nullable in COLUMNS:
+        if not _is_text_column(inspector, table, column):
+            continue
+        tmp = f"{column}_tz"
+        # Колонка могла остаться от прерванного запуска
+        if not _has_column(inspector, table, tmp):
+            op.add_column(table, sa.Column(tmp, sa.DateTime(timezone=True), nullable=True))
+        _backfill(
+            conn,
+            table,
+            f"UPDATE {table} SET {tmp} = pg_temp.try_timestamptz({column}) "
+            f"WHERE id > :lo AND id <= :hi AND {column} IS NOT NULL",
+        )
+        # Дальше одна транзакция (последняя пачка её уже закрыла): запись в таблицу
+        # блокируется до замены колонок, чтение продолжается. Догоняющий проход
+        # ловит и новые строки, и строки, изменённые после своей пачки
+        op.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+        op.execute(
+            f"UPDATE {table} SET {tmp} = pg_temp.try_timestamptz({column}) "
+            f"WHERE {tmp} IS DISTINCT FROM pg_temp.try_timestamptz({column})"
+        )
+        op.drop_column(table, column)
+        op.alter_column(table, tmp, new_column_name=column, nullable=nullable)
+
+    op.create_index(
+        "ix_tasks_user_id_due_datetime",
+        "tasks",
+        ["user_id", "due_datetime"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    op.drop_index("ix_tasks_user_id_due_datetime", table_name="tasks", if_exists=True)
+    for table, column, nullable in COLUMNS:
+        if not _is_timestamp_column(inspector, table, column):
+            continue
+        op.alter_column(
+            table,
+            column,
+            type_=sa.String(),
+            postgresql_using=f"to_char({column} AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS.US') || '+00:00'",
+            existing_nullable=nullable,
+        )
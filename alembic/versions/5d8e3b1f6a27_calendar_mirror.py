@@ -0,0 +1,66 @@
+"""calendar mirror
+
+Состояние инкрементальной синхронизации зеркала календаря
+(users.google_sync_token, users.google_synced_at), уникальный ключ upsert
+событий (user_id, google_event_id) и индекс выборки по диапазону дат.
+
+Перед созданием ограничения удаляются дубликаты событий: из строк с одинаковыми
+(user_id, google_event_id) остаётся последняя. Зеркало всё равно перезаписывает
+их при первой полной синхронизации.
+
+Revision ID: 5d8e3b1f6a27
+Revises: c71d5e2a9f03
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d8e3b1f6a27'
+down_revision: Union[str, Sequence[str], None] = 'c71d5e2a9f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    user_columns = {col["name"] for col in inspector.get_columns("users")}
+    if "google_sync_token" not in user_columns:
+        op.add_column("users", sa.Column("google_sync_token", sa.String(), nullable=True))
+    if "google_synced_at" not in user_columns:
+        op.add_column("users", sa.Column("google_synced_at", sa.DateTime(timezone=True), nullable=True))
+
+    constraints = {c["name"] for c in inspector.get_unique_constraints("events")}
+    if "uq_events_user_id_google_event_id" not in constraints:
+        op.execute(
+            """
+            DELETE FROM events e
+            USING events newer
+            WHERE e.google_event_id IS NOT NULL
+              AND newer.user_id = e.user_id
+              AND newer.google_event_id = e.google_event_id
+              AND newer.id > e.id
+            """
+        )
+        op.create_unique_constraint(
+            "uq_events_user_id_google_event_id", "events", ["user_id", "google_event_id"]
+        )
+    op.create_index(
+        "ix_events_user_id_start_datetime",
+        "events",
+        ["user_id", "start_datetime"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_events_user_id_start_datetime", table_name="events", if_exists=True)
+    op.drop_constraint("uq_events_user_id_google_event_id", "events", type_="unique")
+    op.drop_column("users", "google_synced_at")
+    op.drop_column("users", "google_sync_token")
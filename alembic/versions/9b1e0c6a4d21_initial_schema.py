@@ -0,0 +1,75 @@
+"""initial schema
+
+Исходные таблицы users, tasks, events (даты строками, как в исходных моделях).
+Таблицы, уже созданные раньше (create_all или своей начальной миграцией),
+пропускаются.
+
+Revision ID: 9b1e0c6a4d21
+Revises:
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b1e0c6a4d21'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("telegram_id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(), nullable=True),
+            sa.Column("google_access_token", sa.String(), nullable=True),
+            sa.Column("google_refresh_token", sa.String(), nullable=True),
+            sa.Column("google_token_expiry", sa.String(), nullable=True),
+            sa.Column("timezone", sa.String(), nullable=True),
+        )
+        op.create_index("ix_users_telegram_id", "users", ["telegram_id"], unique=True)
+
+    if not inspector.has_table("tasks"):
+        op.create_table(
+            "tasks",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("description", sa.String(), nullable=False),
+            sa.Column("due_datetime", sa.String(), nullable=True),
+            sa.Column("remind_at", sa.Integer(), nullable=True),
+            sa.Column("duration", sa.Integer(), nullable=True),
+            sa.Column("isReminded", sa.Boolean(), nullable=False),
+            sa.Column("google_event_id", sa.String(), nullable=True),
+        )
+        op.create_index("ix_tasks_id", "tasks", ["id"])
+
+    if not inspector.has_table("events"):
+        op.create_table(
+            "events",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("title", sa.String(), nullable=False),
+            sa.Column("description", sa.String(), nullable=True),
+            sa.Column("start_datetime", sa.String(), nullable=False),
+            sa.Column("end_datetime", sa.String(), nullable=False),
+            sa.Column("google_event_id", sa.String(), nullable=True),
+        )
+        op.create_index("ix_events_id", "events", ["id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("events")
+    op.drop_table("tasks")
+    op.drop_table("users")
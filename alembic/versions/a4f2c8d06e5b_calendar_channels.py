@@ -0,0 +1,43 @@
+"""calendar channels
+
+Таблица calendar_channels: каналы push-уведомлений Google Calendar.
+
+Revision ID: a4f2c8d06e5b
+Revises: 5d8e3b1f6a27
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f2c8d06e5b'
+down_revision: Union[str, Sequence[str], None] = '5d8e3b1f6a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if sa.inspect(op.get_bind()).has_table("calendar_channels"):
+        return
+    op.create_table(
+        "calendar_channels",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("channel_id", sa.String(), nullable=False),
+        sa.Column("resource_id", sa.String(), nullable=True),
+        sa.Column("token", sa.String(), nullable=False),
+        sa.Column("expiration", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_calendar_channels_user_id", "calendar_channels", ["user_id"])
+    op.create_index("ix_calendar_channels_channel_id", "calendar_channels", ["channel_id"], unique=True)
+    op.create_index("ix_calendar_channels_expiration", "calendar_channels", ["expiration"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("calendar_channels")
@@ -0,0 +1,47 @@
+"""calendar outbox
+
+Таблица calendar_outbox: намерения синхронизировать задачи с Google Calendar,
+которые пишутся в одной транзакции с задачей и применяются фоновым воркером.
+
+Revision ID: c71d5e2a9f03
+Revises: 3f9c2a7d1b40
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71d5e2a9f03'
+down_revision: Union[str, Sequence[str], None] = '3f9c2a7d1b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if sa.inspect(op.get_bind()).has_table("calendar_outbox"):
+        return
+    op.create_table(
+        "calendar_outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("task_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("operation", sa.String(), nullable=False),
+        sa.Column("google_event_id", sa.String(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("lease_owner", sa.String(), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_calendar_outbox_task_id", "calendar_outbox", ["task_id"])
+    op.create_index("ix_calendar_outbox_next_attempt_at", "calendar_outbox", ["next_attempt_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("calendar_outbox")
@@ -0,0 +1,42 @@
+"""transcripts
+
+Таблица transcripts: кэш распознанных голосовых по sha256 содержимого
+и file_unique_id Telegram.
+
+Revision ID: e3a7b5c19d08
+Revises: a4f2c8d06e5b
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a7b5c19d08'
+down_revision: Union[str, Sequence[str], None] = 'a4f2c8d06e5b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if sa.inspect(op.get_bind()).has_table("transcripts"):
+        return
+    op.create_table(
+        "transcripts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("content_hash", sa.String(), nullable=False),
+        sa.Column("file_unique_id", sa.String(), nullable=True),
+        sa.Column("text", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_transcripts_content_hash", "transcripts", ["content_hash"], unique=True)
+    op.create_index("ix_transcripts_file_unique_id", "transcripts", ["file_unique_id"], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("transcripts")
@@ -0,0 +1,39 @@
+"""calendar channel failures
+
+Счётчик неудачных регистраций канала push-уведомлений у пользователя
+и время следующей попытки.
+
+Revision ID: f0b6d2c94e71
+Revises: e3a7b5c19d08
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f0b6d2c94e71'
+down_revision: Union[str, Sequence[str], None] = 'e3a7b5c19d08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    user_columns = {col["name"] for col in sa.inspect(op.get_bind()).get_columns("users")}
+    if "google_channel_failures" not in user_columns:
+        op.add_column(
+            "users",
+            sa.Column("google_channel_failures", sa.Integer(), server_default="0", nullable=False),
+        )
+    if "google_channel_retry_at" not in user_columns:
+        op.add_column("users", sa.Column("google_channel_retry_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("users", "google_channel_retry_at")
+    op.drop_column("users", "google_channel_failures")
@@ -1,26 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_session
-from app.db.repositories.task_repo import TaskRepository
-from app.services.calendar import GoogleCalendarService
-from typing import List
+from app.db.repositories.event_repo import EventRepository
+from app.db.repositories.user_repo import UserRepository
+from app.services.calendar import get_calendar_service
+from app.services.calendar_mirror import calendar_mirror
+from app.services.calendar_push import calendar_push, NOTIFICATION_FORBIDDEN, NOTIFICATION_UNKNOWN
+from app.services.calendar_sync import CalendarSyncWorker
+from app.schemas.event import EventOut
+from app.utils.logger import logger
+from typing import List, Optional
+import datetime as dt
 
 router = APIRouter()
+logger = logger("calendar-api")
 
 
 @router.get("/calendar/sync")
 async def sync_calendar(user_id: int, session: AsyncSession = Depends(get_session)):
-    repo = TaskRepository(session)
-    tasks = await repo.get_tasks_by_user(user_id)
-    # TODO: Получить credentials пользователя
-    calendar_service = GoogleCalendarService(credentials=None)
-    synced = []
-    for task in tasks:
-        if not task.google_event_id and task.due_datetime:
-            # Пример синхронизации: создаём событие в календаре
-            event_id = await calendar_service.create_event(
-                user_id=user_id, description=task.description, start=task.due_datetime
-            )
-            # Можно обновить задачу с google_event_id
-            synced.append({"task_id": task.id, "event_id": event_id})
-    return {"synced": synced}
+    user = await UserRepository(session).get_user(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    calendar_service = get_calendar_service(user)
+    if not calendar_service:
+        raise HTTPException(status_code=400, detail="Google Calendar is not connected")
+    # Не держим транзакцию открытой, пока идут batch-запросы к Google
+    await session.commit()
+    # Только ожидающие изменения и удаления из outbox и ещё не синхронизированные задачи
+    event_ids, errors = await CalendarSyncWorker().sync_user(user)
+    synced = [{"task_id": task_id, "event_id": event_id} for task_id, event_id in event_ids.items()]
+    failed = [{"task_id": task_id, "error": str(error)} for task_id, error in errors.items()]
+    return {"synced": synced, "failed": failed}
+
+
+@router.get("/calendar/events", response_model=List[EventOut])
+async def get_calendar_events(
+    user_id: int,
+    start: Optional[dt.datetime] = None,
+    end: Optional[dt.datetime] = None,
+    session: AsyncSession = Depends(get_session),
+):
+    """События из локального зеркала календаря (по умолчанию — на неделю вперёд)."""
+    user = await UserRepository(session).get_user(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Не держим транзакцию открытой, пока зеркало догоняет Google
+    await session.commit()
+    try:
+        await calendar_mirror.ensure_fresh(user)
+    except Exception as e:
+        logger.exception(f"Не удалось синхронизировать календарь пользователя {user_id}: {e}")
+    start = start or dt.datetime.now(dt.timezone.utc)
+    end = end or start + dt.timedelta(days=7)
+    return await EventRepository(session).get_events_in_range(user_id, start, end)
+
+
+@router.post("/calendar/notifications", status_code=200)
+async def calendar_notification(
+    x_goog_channel_id: str = Header(...),
+    x_goog_resource_state: str = Header(...),
+    x_goog_channel_token: Optional[str] = Header(None),
+):
+    """
+    Приёмник push-уведомлений Google Calendar (events.watch).
+    Тело пустое, всё в заголовках; синхронизация идёт в фоне, ответ — сразу.
+    """
+    result = await calendar_push.handle_notification(
+        x_goog_channel_id, x_goog_resource_state, x_goog_channel_token
+    )
+    if result == NOTIFICATION_FORBIDDEN:
+        raise HTTPException(status_code=403, detail="Invalid channel token")
+    if result == NOTIFICATION_UNKNOWN:
+        # Канал уже удалён у нас: 2xx, чтобы Google не повторял доставку
+        logger.info(f"Уведомление по неизвестному каналу {x_goog_channel_id}")
+    return Response(status_code=200)
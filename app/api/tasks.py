@@ -27,8 +27,6 @@ async def delete_task(
     user_id: int, task_id: int, session: AsyncSession = Depends(get_session)
 ):
     repo = TaskRepository(session)
-    task = await repo.get_task(task_id)
-    if not task or task.user_id != user_id:
+    if not await repo.delete_task(task_id, user_id=user_id):
         raise HTTPException(status_code=404, detail="Task not found")
-    await repo.delete_task(task_id)
     return {"ok": True}
@@ -1,21 +1,38 @@
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
-from app.bot_handlers import tasks, voice, start, google_connect
+from app.bot_handlers import tasks, voice, start, google_connect, calendar
+from app.bot_middlewares.db_session import DbSessionMiddleware
 import asyncio
 from app.config import settings
 from app.utils.logger import logger
 from app.services.reminder_scheduler import reminder_scheduler
+from app.services.calendar_sync import calendar_sync_worker
+from app.services.telegram_sender import TelegramRateLimiter, TelegramSender, RateLimitMiddleware
+from app.utils.metrics import metrics_reporter
+from app.utils.http import close_http_session
+from app.services.google_auth import credential_manager
+from app.services.transcription import shutdown_transcription_pool
+from app.services.transcription_queue import transcription_queue
 
 
 bot = Bot(token=settings.TELEGRAM_TOKEN)
 dp = Dispatcher(storage=MemoryStorage())
 logger = logger("bot")
 
+# Общий лимитер: и ответы хендлеров, и очередь рассылок
+rate_limiter = TelegramRateLimiter()
+bot.session.middleware(RateLimitMiddleware(rate_limiter))
+sender = TelegramSender(bot, rate_limiter)
+
+# Одна сессия БД и один поиск пользователя на апдейт
+dp.update.middleware(DbSessionMiddleware())
+
 
 def register_handlers():
     dp.include_router(google_connect.router)
     
     dp.include_router(start.router)
+    dp.include_router(calendar.router)
     dp.include_router(tasks.router)
     dp.include_router(voice.router)
 
@@ -25,11 +42,23 @@ async def start_bot():
     try:
         register_handlers()
         logger.info("Bot is starting polling...")
-        # Запуск планировщика напоминаний
-        asyncio.create_task(reminder_scheduler(bot))
+        # Запуск планировщика напоминаний (воркеры можно вынести в отдельные процессы)
+        if settings.REMINDER_WORKER_ENABLED:
+            asyncio.create_task(reminder_scheduler(bot, sender))
+        if settings.CALENDAR_SYNC_WORKER_ENABLED:
+            asyncio.create_task(calendar_sync_worker())
+        asyncio.create_task(metrics_reporter())
+        # Google токены активных пользователей обновляются заранее, в фоне
+        asyncio.create_task(credential_manager.run())
+        # Локальная модель распознавания грузится заранее, а не на первом голосовом
+        asyncio.create_task(voice.transcription_service.warm_up())
         await dp.start_polling(bot)
     except Exception as e:
         logger.exception(f"Bot failed to start: {e}")
+    finally:
+        await transcription_queue.stop()
+        shutdown_transcription_pool()
+        await close_http_session()
 
 
 if __name__ == "__main__":
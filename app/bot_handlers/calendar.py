@@ -0,0 +1,48 @@
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import datetime as dt
+from app.bot_handlers.tasks import get_tzinfo
+from app.db.repositories.event_repo import EventRepository
+from app.models.user import User
+from app.services.calendar_mirror import calendar_mirror
+from app.utils.logger import logger
+
+router = Router()
+logger = logger("calendar-handler")
+
+CALENDAR_DAYS = 7
+MESSAGE_TEXT_LIMIT = 4096
+
+
+@router.message(Command("calendar"))
+async def show_calendar_handler(message: Message, session: AsyncSession, user: Optional[User]):
+    if not user:
+        await message.answer("Ошибка: не удалось определить пользователя Telegram.")
+        return
+    try:
+        connected = await calendar_mirror.ensure_fresh(user)
+    except Exception as e:
+        # Google недоступен — показываем то, что уже есть в зеркале
+        logger.exception(f"Не удалось синхронизировать календарь пользователя {user.id}: {e}")
+        connected = True
+    if not connected:
+        await message.answer("Google Calendar не подключён. Подключить: /google")
+        return
+    user_tz = get_tzinfo(user.timezone)
+    now = dt.datetime.now(dt.timezone.utc)
+    events = await EventRepository(session).get_events_in_range(
+        user.id, now, now + dt.timedelta(days=CALENDAR_DAYS)
+    )
+    if not events:
+        await message.answer(f"В ближайшие {CALENDAR_DAYS} дней событий нет.")
+        return
+    lines = []
+    for event in events:
+        start = event.start_datetime.astimezone(user_tz)
+        end = event.end_datetime.astimezone(user_tz)
+        lines.append(f"📅 {start.strftime('%d.%m %H:%M')}–{end.strftime('%H:%M')} {event.title}")
+    text = f"События на {CALENDAR_DAYS} дней:\n" + "\n".join(lines)
+    await message.answer(text[:MESSAGE_TEXT_LIMIT])
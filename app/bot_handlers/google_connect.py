@@ -1,43 +1,40 @@
+import datetime as dt
 from aiogram import Router
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from app.db.session import get_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user import User
 from app.db.repositories.user_repo import UserRepository
-from app.services.google_auth import get_google_auth_flow, get_auth_url, fetch_tokens
+from app.services.google_auth import get_google_auth_flow, get_auth_url, fetch_tokens, credential_manager
+from app.services.calendar_push import calendar_push
 from app.utils.logger import logger
 
 router = Router()
 logger = logger("google-connect-handler")
 
 @router.message(Command("google"))
-async def google_handler(message: Message, state: FSMContext):
-    await show_google_menu(message, message.from_user.id, state)
+async def google_handler(message: Message, state: FSMContext, user: User):
+    await show_google_menu(message, user)
 
-async def show_google_menu(target, user_id, state):
-    async for session in get_session():
-        user_repo = UserRepository(session)
-        user = await user_repo.get_or_create_user(
-            telegram_id=user_id,
-            name=None,
+async def show_google_menu(target, user: User):
+    if user.google_access_token and user.google_refresh_token:
+        text = "✅ Google Calendar подключён!"
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [InlineKeyboardButton(text="Отключить", callback_data="google_disconnect")],
+                [InlineKeyboardButton(text="⬅️ Назад", callback_data="settings_menu")],
+            ]
+        )
+    else:
+        text = "❌ Google Calendar не подключён."
+        keyboard = InlineKeyboardMarkup(
+            inline_keyboard=[
+                [InlineKeyboardButton(text="🔗 Подключить Google Calendar", callback_data="google_connect")],
+                [InlineKeyboardButton(text="⬅️ Назад", callback_data="settings_menu")],
+            ]
         )
-        if user.google_access_token and user.google_refresh_token:
-            text = "✅ Google Calendar подключён!"
-            keyboard = InlineKeyboardMarkup(
-                inline_keyboard=[
-                    [InlineKeyboardButton(text="Отключить", callback_data="google_disconnect")],
-                    [InlineKeyboardButton(text="⬅️ Назад", callback_data="settings_menu")],
-                ]
-            )
-        else:
-            text = "❌ Google Calendar не подключён."
-            keyboard = InlineKeyboardMarkup(
-                inline_keyboard=[
-                    [InlineKeyboardButton(text="🔗 Подключить Google Calendar", callback_data="google_connect")],
-                    [InlineKeyboardButton(text="⬅️ Назад", callback_data="settings_menu")],
-                ]
-            )
-        await target.answer(text, reply_markup=keyboard)
+    await target.answer(text, reply_markup=keyboard)
 
 @router.callback_query(lambda c: c.data == "google_connect")
 async def google_connect_callback(callback: CallbackQuery, state: FSMContext):
@@ -69,7 +66,7 @@ async def google_enter_code_callback(callback: CallbackQuery, state: FSMContext)
     await callback.answer()
 
 @router.message(StateFilter("waiting_for_google_code"))
-async def google_code_inline_handler(message: Message, state: FSMContext):
+async def google_code_inline_handler(message: Message, state: FSMContext, session: AsyncSession, user: User):
     code = message.text.strip()
     data = await state.get_data()
     flow = data.get("google_flow")
@@ -78,18 +75,28 @@ async def google_code_inline_handler(message: Message, state: FSMContext):
         return
     try:
         credentials = fetch_tokens(flow, code)
-        async for session in get_session():
-            user_repo = UserRepository(session)
-            user = await user_repo.get_or_create_user(
-                telegram_id=message.from_user.id,
-                name=message.from_user.full_name or None,
-            )
-            user.google_access_token = credentials.token
-            user.google_refresh_token = credentials.refresh_token
-            user.google_token_expiry = credentials.expiry.isoformat()
-            await session.commit()
-            await message.answer("Google аккаунт успешно привязан!")
-            await show_google_menu(message, message.from_user.id, state)
+        await UserRepository(session).update_user(
+            user,
+            google_access_token=credentials.token,
+            google_refresh_token=credentials.refresh_token,
+            # google-auth отдаёт expiry как наивный UTC
+            google_token_expiry=credentials.expiry.replace(tzinfo=dt.timezone.utc) if credentials.expiry else None,
+            # Аккаунт мог смениться: зеркало календаря строим заново
+            google_sync_token=None,
+            google_synced_at=None,
+            # Новые токены — регистрация канала снова без паузы
+            google_channel_failures=0,
+            google_channel_retry_at=None,
+        )
+        credential_manager.forget(user.id)
+        try:
+            await calendar_push.unregister(user)
+            await calendar_push.register(user)
+        except Exception as e:
+            # Канал зарегистрирует фоновое продление
+            logger.warning(f"Не удалось зарегистрировать канал календаря пользователя {user.id}: {e}")
+        await message.answer("Google аккаунт успешно привязан!")
+        await show_google_menu(message, user)
         await state.clear()
     except Exception as e:
         logger.exception(f"Ошибка при получении токенов Google: {e}")
@@ -99,17 +106,20 @@ async def google_code_inline_handler(message: Message, state: FSMContext):
         )
 
 @router.callback_query(lambda c: c.data == "google_disconnect")
-async def google_disconnect_callback(callback: CallbackQuery, state: FSMContext):
-    async for session in get_session():
-        user_id = callback.from_user.id
-        user_repo = UserRepository(session)
-        user = await user_repo.get_or_create_user(
-            telegram_id=user_id,
-            name=callback.from_user.full_name or None,
-        )
-        user.google_access_token = None
-        user.google_refresh_token = None
-        user.google_token_expiry = None
-        await session.commit()
-        await show_google_menu(callback.message, user_id, state)
+async def google_disconnect_callback(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user: User):
+    try:
+        # Каналы останавливаем, пока токены ещё действуют
+        await calendar_push.unregister(user)
+    except Exception as e:
+        logger.warning(f"Не удалось остановить каналы календаря пользователя {user.id}: {e}")
+    await UserRepository(session).update_user(
+        user,
+        google_access_token=None,
+        google_refresh_token=None,
+        google_token_expiry=None,
+        google_sync_token=None,
+        google_synced_at=None,
+    )
+    credential_manager.forget(user.id)
+    await show_google_menu(callback.message, user)
     await callback.answer() 
\ No newline at end of file
@@ -2,7 +2,9 @@ from aiogram import Router
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from app.db.session import get_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user import User
+from app.db.repositories.user_repo import UserRepository
 
 router = Router()
 
@@ -32,25 +34,17 @@ async def change_timezone_callback(callback, state: FSMContext):
     await state.set_state(SettingsStates.waiting_for_timezone)
 
 @router.message(SettingsStates.waiting_for_timezone)
-async def set_timezone_handler(message: Message, state: FSMContext):
+async def set_timezone_handler(message: Message, state: FSMContext, session: AsyncSession, user: User):
     tz = message.text.strip()
     import re
     if not re.match(r"^[+-](0\d|1[0-4]):[0-5]\d$", tz):
         await message.answer("Некорректный формат. Введите, например, +03:00 или -05:00")
         return
-    async for session in get_session():
-        from app.db.repositories.user_repo import UserRepository
-        user_repo = UserRepository(session)
-        user = await user_repo.get_or_create_user(
-            telegram_id=message.from_user.id,
-            name=message.from_user.full_name or None,
-        )
-        user.timezone = tz
-        await session.commit()
-        await message.answer(f"Часовой пояс обновлён: {tz}")
-        await state.clear()
-        # Возврат в меню настроек
-        await message.answer(
-            "⚙️ Настройки:\n\nВыберите опцию:",
-            reply_markup=settings_menu
-        ) 
\ No newline at end of file
+    await UserRepository(session).update_user(user, timezone=tz)
+    await message.answer(f"Часовой пояс обновлён: {tz}")
+    await state.clear()
+    # Возврат в меню настроек
+    await message.answer(
+        "⚙️ Настройки:\n\nВыберите опцию:",
+        reply_markup=settings_menu
+    ) 
\ No newline at end of file
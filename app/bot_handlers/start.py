@@ -4,7 +4,7 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from app.bot_handlers.google_connect import show_google_menu
-from app.db.session import get_session
+from app.models.user import User
 from app.bot_handlers.settings import router as settings_router
 
 router = Router()
@@ -69,8 +69,8 @@ async def show_main_menu(callback):
     )
 
 @router.callback_query(lambda c: c.data == "google_settings")
-async def show_google_menu_callback(callback, state: FSMContext):
-    await show_google_menu(callback.message, callback.from_user.id, state)
+async def show_google_menu_callback(callback, state: FSMContext, user: User):
+    await show_google_menu(callback.message, user)
 
 @router.callback_query(lambda c: c.data == "show_tasks")
 async def show_tasks_menu(callback):
@@ -1,97 +1,139 @@
 from aiogram import Router
 from aiogram.types import Message, InputFile, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from app.services.langchain_tools import AddTaskTool
-from app.db.session import get_session
-from app.db.repositories.user_repo import UserRepository
-import aiohttp
-import os
-import uuid
+from app.models.user import User
+from io import BytesIO
 from app.config import settings
-from app.services.sync_google_calendar import sync_task_with_google_calendar
-from app.utils import parse_task_text
-import assemblyai as aai
+from app.utils.exceptions import FileTooLargeError
+from app.utils.http import download_to_buffer
+from app.services.calendar_sync import calendar_sync_note
+from app.services.transcription import TranscriptionService
+from app.services.transcript_cache import transcript_cache, audio_hash
+from app.services.transcription_queue import (
+    transcription_queue,
+    QueueFullError,
+    CANCELLED_QUEUED,
+    CANCELLED_RUNNING,
+)
 import asyncio
 
 router = Router()
 
-aai.settings.api_key = settings.ai.ASSEMBLYAI_API_KEY
+transcription_service = TranscriptionService()
+
+QUEUE_FULL_TEXT = "Сейчас слишком много голосовых в обработке, попробуйте чуть позже."
+QUEUED_TEXT = "Голосовое в очереди на распознавание..."
+PROCESSING_TEXT = "Обработка..."
+
+
+def _cancel_markup() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text="Отменить", callback_data="cancel_processing")]]
+    )
+
+
+def _job_key(msg: Message) -> tuple:
+    return msg.chat.id, msg.message_id
+
+
+def _queued_text(position: int) -> str:
+    return f"{QUEUED_TEXT}\nМесто в очереди: {position}"
 
-processing_tasks = {}
 
 @router.message(lambda m: m.voice is not None)
-async def voice_message_handler(message: Message):
+async def voice_message_handler(message: Message, user: User):
     try:
+        if message.voice.file_size and message.voice.file_size > settings.VOICE_MAX_BYTES:
+            await message.answer("Голосовое сообщение слишком большое.")
+            return
+        file_unique_id = message.voice.file_unique_id
+        # Повтор или пересылка уже распознанного файла — без скачивания и очереди
+        text = await transcript_cache.get_by_file_id(file_unique_id)
+        if text is not None:
+            await add_transcribed_task(user, await message.reply("Обработка..."), text)
+            return
+        # Очередь полна — отказываем до скачивания файла
+        if not transcription_queue.has_room(user.id):
+            await message.answer(QUEUE_FULL_TEXT)
+            return
         file_id = message.voice.file_id
         file = await message.bot.get_file(file_id)
         file_path = file.file_path
         file_url = f"https://api.telegram.org/file/bot{message.bot.token}/{file_path}"
-        local_filename = f"/tmp/{uuid.uuid4()}.ogg"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(file_url) as resp:
-                with open(local_filename, "wb") as f:
-                    f.write(await resp.read())
-
-        cancel_markup = InlineKeyboardMarkup(
-            inline_keyboard=[[InlineKeyboardButton(text="Отменить", callback_data="cancel_processing")]]
-        )
+        # Общий пул соединений, чтение по частям с пределом размера; аудио остаётся в памяти
+        audio = await download_to_buffer(file_url, settings.VOICE_MAX_BYTES)
+        # То же аудио в другом файле (например, загруженное заново)
+        content_hash = audio_hash(audio)
+        text = await transcript_cache.get_by_hash(content_hash, file_unique_id)
+        if text is not None:
+            await add_transcribed_task(user, await message.reply("Обработка..."), text)
+            return
+
+        # Место в очереди очередь обновляет сама, пока голосовое ждёт;
+        # когда его возьмёт воркер, сообщение сменится на «Обработка...»
+        position = transcription_queue.estimate_position(user.id)
+        queued = position > 0
         processing_msg = await message.reply(
-            "Обработка...",
-            reply_markup=cancel_markup
+            _queued_text(position) if queued else PROCESSING_TEXT, reply_markup=_cancel_markup()
         )
 
-        task = asyncio.create_task(
-            process_voice_logic(message, processing_msg, local_filename)
-        )
-        processing_tasks[processing_msg.message_id] = task
+        async def show_position(pos: int):
+            nonlocal queued
+            # Очередь могла вырасти, пока отправлялся ответ
+            queued = True
+            await processing_msg.edit_text(_queued_text(pos), reply_markup=_cancel_markup())
+
+        try:
+            transcription_queue.submit(
+                _job_key(processing_msg),
+                user.id,
+                lambda: process_voice_logic(user, processing_msg, audio, content_hash, file_unique_id, queued),
+                on_position=show_position,
+                position=position,
+            )
+        except QueueFullError:
+            await processing_msg.edit_text(QUEUE_FULL_TEXT)
+    except FileTooLargeError:
+        await message.answer("Голосовое сообщение слишком большое.")
     except Exception as e:
         await message.answer("Произошла ошибка при обработке голосового сообщения.")
 
-async def process_voice_logic(message: Message, processing_msg: Message, local_filename: str):
+async def add_transcribed_task(user: User, processing_msg: Message, text: str):
+    # Сессия апдейта к этому моменту закрыта: пользователь уже отсоединён от неё,
+    # а AddTaskTool открывает свою сессию (событие в календаре создаст воркер синхронизации)
+    add_task_tool = AddTaskTool()
+    result = await add_task_tool._arun(user_id=user.id, description=text)
+    await processing_msg.edit_text(
+        f"Голосовое сообщение распознано и задача добавлена: {result.get('description', text)}\n{calendar_sync_note(user)}"
+    )
+
+async def process_voice_logic(
+    user: User,
+    processing_msg: Message,
+    audio: BytesIO,
+    content_hash: str,
+    file_unique_id: str,
+    queued: bool = False,
+):
     try:
-        transcriber = aai.Transcriber()
-        config = aai.TranscriptionConfig(language_code="ru", speech_model=aai.SpeechModel.best)
-        transcript = await asyncio.get_event_loop().run_in_executor(
-            None, lambda: transcriber.transcribe(local_filename, config=config)
-        )
-        text = transcript.text if transcript.text else ""
-        os.remove(local_filename)
-        async for db_session in get_session():
-            user_repo = UserRepository(db_session)
-            user = await user_repo.get_or_create_user(
-                telegram_id=message.from_user.id,
-                name=message.from_user.full_name or None,
-            )
-            add_task_tool = AddTaskTool()
-            result = await add_task_tool._arun(user_id=user.id, description=text)
-            parsed = parse_task_text(text)
-            ok, sync_msg = await sync_task_with_google_calendar(
-                user,
-                type('Task', (), {'id': result['id'], 'description': result.get('description', text)}),
-                parsed
-            )
-            await processing_msg.edit_text(
-                f"Голосовое сообщение распознано и задача добавлена: {result.get('description', text)}\n{sync_msg}"
-            )
-            break
+        if queued:
+            await processing_msg.edit_text(PROCESSING_TEXT, reply_markup=_cancel_markup())
+        text = await transcription_service.transcribe_audio(audio)
+        if text:
+            await transcript_cache.put(content_hash, file_unique_id, text)
+        await add_transcribed_task(user, processing_msg, text)
     except asyncio.CancelledError:
-        await processing_msg.edit_text("Обработка отменена.")
-        return
+        # Сообщение уже обновил обработчик кнопки «Отменить»
+        raise
     except Exception as e:
         await processing_msg.edit_text("Произошла ошибка при обработке голосового сообщения.")
-    finally:
-        if os.path.exists(local_filename):
-            try:
-                os.remove(local_filename)
-            except Exception:
-                pass
-        processing_tasks.pop(processing_msg.message_id, None)
 
 @router.callback_query(lambda c: c.data == "cancel_processing")
 async def cancel_processing_handler(callback: CallbackQuery):
-    msg_id = callback.message.message_id
-    task = processing_tasks.get(msg_id)
-    if task and not task.done():
-        task.cancel()
+    result = transcription_queue.cancel(_job_key(callback.message))
+    if result in (CANCELLED_QUEUED, CANCELLED_RUNNING):
+        # Запущенное распознавание досчитается в пуле, но его результат уже не нужен
+        await callback.message.edit_text("Обработка отменена.")
         await callback.answer("Обработка отменена")
     else:
         await callback.answer("Обработка уже завершена или отменена", show_alert=True)
@@ -0,0 +1,30 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from app.db.session import AsyncSessionLocal
+from app.db.repositories.user_repo import UserRepository
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Открывает одну сессию БД на апдейт и один раз находит пользователя.
+    Хендлеры получают их как аргументы `session` и `user`
+    (user — None, если апдейт пришёл не от пользователя).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with AsyncSessionLocal() as session:
+            data["session"] = session
+            from_user = data.get("event_from_user")
+            data["user"] = None
+            if from_user is not None:
+                data["user"] = await UserRepository(session).get_or_create_user(
+                    telegram_id=from_user.id,
+                    name=from_user.full_name or None,
+                )
+            return await handler(event, data)
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -23,6 +24,90 @@ class Settings(BaseSettings):
     GOOGLE_CLIENT_SECRET: str = "YOUR_GOOGLE_CLIENT_SECRET"
     GOOGLE_REDIRECT_URI: str = "http://localhost:8000/auth/callback"
 
+    # Запускать воркер напоминаний внутри процесса бота
+    REMINDER_WORKER_ENABLED: bool = True
+    # Прямое подключение к Postgres для LISTEN изменений расписания напоминаний
+    # (пусто — DATABASE_URL; за PgBouncer в режиме transaction pooling LISTEN не работает)
+    REMINDER_LISTEN_DATABASE_URL: str = ""
+
+    # Запускать воркер синхронизации с Google Calendar внутри процесса бота
+    CALENDAR_SYNC_WORKER_ENABLED: bool = True
+
+    # Push-уведомления Google Calendar: публичный HTTPS-адрес POST /calendar/notifications.
+    # Пусто — каналы не регистрируются, зеркало догоняется только при чтении
+    GOOGLE_WEBHOOK_URL: str = ""
+    # Регистрировать и продлевать каналы внутри процесса API
+    CALENDAR_CHANNEL_WORKER_ENABLED: bool = True
+
+    # Лимиты исходящих сообщений Telegram (сообщений в секунду)
+    TELEGRAM_GLOBAL_RATE: float = 30.0
+    TELEGRAM_CHAT_RATE: float = 1.0
+    TELEGRAM_CHAT_BURST: float = 3.0
+
+    # Пул соединений с БД. DB_POOL_PRESET (bot / api / worker) задаёт размеры пула
+    # под тип процесса; явно указанные DB_* переопределяют значения пресета
+    DB_POOL_PRESET: Literal["", "bot", "api", "worker"] = ""
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # За PgBouncer в режиме transaction pooling: без кэша prepared statements asyncpg
+    DB_PGBOUNCER: bool = False
+
+    # Исходящие HTTP-запросы (общий пул aiohttp)
+    HTTP_POOL_SIZE: int = 100
+    HTTP_POOL_SIZE_PER_HOST: int = 30
+    HTTP_KEEPALIVE_TIMEOUT: float = 30.0
+    HTTP_TIMEOUT: float = 30.0
+    # Предел размера голосового сообщения (Bot API отдаёт файлы до 20 МБ)
+    VOICE_MAX_BYTES: int = 20 * 1024 * 1024
+
+    # Распознавание речи: api — AssemblyAI, local — faster-whisper на CPU (pip install ".[local]")
+    TRANSCRIPTION_MODE: Literal["api", "local"] = "api"
+    TRANSCRIPTION_LANGUAGE: str = "ru"
+    # Очередь голосовых: одновременно распознаваемых, ожидающих всего и у одного пользователя
+    TRANSCRIPTION_CONCURRENCY: int = 4
+    TRANSCRIPTION_QUEUE_SIZE: int = 100
+    TRANSCRIPTION_QUEUE_PER_USER: int = 5
+    # LRU распознанных голосовых в памяти (второй уровень — таблица transcripts)
+    TRANSCRIPT_CACHE_SIZE: int = 1000
+    TRANSCRIPT_CACHE_TTL: float = 24 * 3600.0
+    # Процессов в пуле локального распознавания (в каждом своя копия модели)
+    TRANSCRIPTION_WORKERS: int = 2
+    WHISPER_MODEL: str = "small"
+    WHISPER_COMPUTE_TYPE: str = "int8"
+    # Потоков на процесс; 0 — решает CTranslate2
+    WHISPER_CPU_THREADS: int = 0
+    # Таймаут одного вызова Google Calendar API, секунд
+    GOOGLE_API_TIMEOUT: float = 10.0
+    # Вызовов в одном batch-запросе к Calendar API (Google допускает до 1000)
+    GOOGLE_BATCH_SIZE: int = 50
+    # Лимиты запросов к Google API (вызовов в секунду): на весь процесс и на пользователя
+    GOOGLE_PROJECT_RATE: float = 100.0
+    GOOGLE_USER_RATE: float = 5.0
+    GOOGLE_USER_BURST: float = 10.0
+    # Повторы при квоте и временных ошибках: экспоненциальный backoff с jitter, секунд
+    GOOGLE_MAX_RETRIES: int = 4
+    GOOGLE_RETRY_BASE: float = 1.0
+    GOOGLE_RETRY_MAX: float = 32.0
+    # За сколько секунд до истечения обновлять Google access token
+    GOOGLE_TOKEN_REFRESH_MARGIN: float = 300.0
+    # Кэш сервисов календаря по учётным данным пользователя
+    CALENDAR_SERVICE_CACHE_SIZE: int = 1000
+    CALENDAR_SERVICE_CACHE_TTL: float = 3600.0
+    # Зеркало календаря старше стольких секунд догоняется инкрементально перед чтением
+    CALENDAR_MIRROR_MAX_AGE: float = 300.0
+    # Запрашиваемый срок жизни канала уведомлений и запас для его продления, секунд
+    CALENDAR_CHANNEL_TTL: int = 7 * 24 * 3600
+    CALENDAR_CHANNEL_RENEW_MARGIN: int = 24 * 3600
+    # Уведомления одного пользователя за это окно схлопываются в одну синхронизацию, секунд
+    CALENDAR_PUSH_DEBOUNCE: float = 2.0
+
+    # Кэш пользователей по telegram_id (секунды / число записей)
+    USER_CACHE_TTL: float = 300.0
+    USER_CACHE_SIZE: int = 10_000
+
     ai: AISettings = AISettings()
 
 
@@ -0,0 +1,99 @@
+from sqlalchemy import delete, exists, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+from app.models.calendar_channel import CalendarChannel
+from app.models.user import User
+from typing import List, Optional
+from app.utils.logger import logger
+from datetime import datetime
+
+CHANNEL_BATCH_LIMIT = 100
+
+
+def _google_connected():
+    # Те же поля, без которых get_calendar_service не построит сервис
+    return (
+        User.google_access_token != None,
+        User.google_refresh_token != None,
+        User.google_token_expiry != None,
+    )
+
+
+def _not_backing_off(now: datetime):
+    return or_(User.google_channel_retry_at == None, User.google_channel_retry_at <= now)
+
+
+class CalendarChannelRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.log = logger("CalendarChannelRepository")
+
+    async def add(
+        self, user_id: int, channel_id: str, resource_id: Optional[str], token: str, expiration: datetime
+    ) -> CalendarChannel:
+        channel = CalendarChannel(
+            user_id=user_id,
+            channel_id=channel_id,
+            resource_id=resource_id,
+            token=token,
+            expiration=expiration,
+        )
+        self.session.add(channel)
+        await self.session.commit()
+        return channel
+
+    async def get_by_channel_id(self, channel_id: str) -> Optional[CalendarChannel]:
+        result = await self.session.execute(
+            select(CalendarChannel).where(CalendarChannel.channel_id == channel_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def get_by_user(self, user_id: int) -> List[CalendarChannel]:
+        result = await self.session.execute(
+            select(CalendarChannel).where(CalendarChannel.user_id == user_id)
+        )
+        return list(result.scalars().all())
+
+    async def get_expiring(
+        self, before: datetime, now: datetime, limit: int = CHANNEL_BATCH_LIMIT
+    ) -> List[CalendarChannel]:
+        """
+        Каналы, истекающие до before, для которых у пользователя ещё нет более свежего.
+        Пользователи, чья регистрация канала недавно не удалась, ждут своего retry_at.
+        """
+        other = aliased(CalendarChannel)
+        newer = exists().where(other.user_id == CalendarChannel.user_id, other.expiration >= before)
+        result = await self.session.execute(
+            select(CalendarChannel)
+            .join(User, User.id == CalendarChannel.user_id)
+            .where(CalendarChannel.expiration < before, ~newer, _not_backing_off(now))
+            .order_by(CalendarChannel.expiration)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def get_users_without_channel(self, now: datetime, limit: int = CHANNEL_BATCH_LIMIT) -> List[User]:
+        """
+        Пользователи с подключённым Google, у которых нет ни одного канала.
+        Пропускает тех, чья регистрация недавно не удалась (например, отозван токен):
+        иначе они навсегда занимают начало выборки.
+        """
+        has_channel = exists().where(CalendarChannel.user_id == User.id)
+        result = await self.session.execute(
+            select(User)
+            .where(*_google_connected(), ~has_channel, _not_backing_off(now))
+            .order_by(User.id)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def delete(self, channel_ids: List[str]) -> None:
+        if not channel_ids:
+            return
+        await self.session.execute(
+            delete(CalendarChannel)
+            .where(CalendarChannel.channel_id.in_(channel_ids))
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
@@ -0,0 +1,124 @@
+from sqlalchemy import delete, event, exists, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import Session, aliased
+from app.models.calendar_outbox import CalendarOutbox
+from typing import List, Optional
+from app.utils.logger import logger
+from datetime import datetime, timedelta
+
+OUTBOX_BATCH_LIMIT = 100
+OPERATION_UPSERT = "upsert"
+OPERATION_DELETE = "delete"
+
+# Флаг в session.info: в транзакции появились новые записи outbox
+_WAKE_KEY = "calendar_outbox_changed"
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_calendar_sync(session: Session) -> None:
+    if session.info.pop(_WAKE_KEY, False):
+        # Импорт внутри функции: воркер сам зависит от репозитория
+        from app.services.calendar_sync import notify_calendar_sync
+        notify_calendar_sync()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_wake_flag(session: Session) -> None:
+    session.info.pop(_WAKE_KEY, None)
+
+
+class CalendarOutboxRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.log = logger("CalendarOutboxRepository")
+
+    def add(self, task_id: int, user_id: int, operation: str, google_event_id: Optional[str] = None) -> None:
+        """Добавляет запись в текущую транзакцию (запишется вместе с задачей)."""
+        self.session.add(
+            CalendarOutbox(
+                task_id=task_id,
+                user_id=user_id,
+                operation=operation,
+                google_event_id=google_event_id,
+            )
+        )
+        self.session.info[_WAKE_KEY] = True
+
+    async def claim(
+        self,
+        worker_id: str,
+        now: datetime,
+        lease: timedelta,
+        limit: int = OUTBOX_BATCH_LIMIT,
+        user_id: Optional[int] = None,
+    ) -> List[CalendarOutbox]:
+        """
+        Забирает в аренду готовые к отправке записи (FOR UPDATE SKIP LOCKED),
+        с user_id — только записи этого пользователя.
+        Записи задач, которые сейчас обрабатывает другой воркер, пропускаются,
+        чтобы операции одной задачи не применялись параллельно.
+        """
+        other = aliased(CalendarOutbox)
+        busy = exists().where(
+            other.task_id == CalendarOutbox.task_id,
+            other.id != CalendarOutbox.id,
+            other.lease_expires_at > now,
+        )
+        conditions = [
+            CalendarOutbox.next_attempt_at <= now,
+            or_(CalendarOutbox.lease_expires_at == None, CalendarOutbox.lease_expires_at <= now),
+            ~busy,
+        ]
+        if user_id is not None:
+            conditions.append(CalendarOutbox.user_id == user_id)
+        candidates = (
+            select(CalendarOutbox.id)
+            .where(*conditions)
+            .order_by(CalendarOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.execute(
+            update(CalendarOutbox)
+            .where(CalendarOutbox.id.in_(candidates.scalar_subquery()))
+            .values(lease_owner=worker_id, lease_expires_at=now + lease)
+            .returning(CalendarOutbox)
+            .execution_options(synchronize_session=False)
+        )
+        rows = sorted(result.scalars().all(), key=lambda row: row.id)
+        await self.session.commit()
+        self.log.debug(f"Воркер {worker_id} забрал записей outbox: {len(rows)}")
+        return rows
+
+    async def complete(self, ids: List[int], worker_id: str) -> None:
+        if not ids:
+            return
+        await self.session.execute(
+            delete(CalendarOutbox)
+            .where(CalendarOutbox.id.in_(ids), CalendarOutbox.lease_owner == worker_id)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+
+    async def retry(self, ids: List[int], worker_id: str, next_attempt_at: datetime, error: str) -> None:
+        if not ids:
+            return
+        await self.session.execute(
+            update(CalendarOutbox)
+            .where(CalendarOutbox.id.in_(ids), CalendarOutbox.lease_owner == worker_id)
+            .values(
+                attempts=CalendarOutbox.attempts + 1,
+                next_attempt_at=next_attempt_at,
+                last_error=error[:1000],
+                lease_owner=None,
+                lease_expires_at=None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+
+    async def next_attempt_at(self) -> Optional[datetime]:
+        """Когда будет готова ближайшая запись (для сна воркера)."""
+        result = await self.session.execute(select(CalendarOutbox.next_attempt_at).order_by(CalendarOutbox.next_attempt_at).limit(1))
+        return result.scalar()
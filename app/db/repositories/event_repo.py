@@ -0,0 +1,71 @@
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.models.event import Event
+from typing import List
+from app.utils.logger import logger
+from datetime import datetime
+
+# Строк в одном INSERT ... ON CONFLICT (asyncpg ограничивает число параметров)
+UPSERT_CHUNK = 1000
+
+
+class EventRepository:
+    """Зеркало событий Google Calendar. autocommit — как в TaskRepository."""
+
+    def __init__(self, session: AsyncSession, autocommit: bool = True):
+        self.session = session
+        self.autocommit = autocommit
+        self.log = logger("EventRepository")
+
+    async def _commit(self) -> None:
+        if self.autocommit:
+            await self.session.commit()
+        else:
+            await self.session.flush()
+
+    async def get_events_in_range(self, user_id: int, start: datetime, end: datetime) -> List[Event]:
+        """События, пересекающие [start, end), по индексу (user_id, start_datetime)."""
+        result = await self.session.execute(
+            select(Event)
+            .where(
+                Event.user_id == user_id,
+                Event.start_datetime < end,
+                Event.end_datetime > start,
+            )
+            .order_by(Event.start_datetime)
+        )
+        return list(result.scalars().all())
+
+    async def apply_changes(
+        self, user_id: int, upserts: List[dict], deleted_ids: List[str], full: bool = False
+    ) -> None:
+        """
+        Применяет изменения календаря: upserts — строки events (title, description,
+        start_datetime, end_datetime, google_event_id), deleted_ids — удалённые события.
+        full=True — полная ресинхронизация: всё, чего нет в upserts, удаляется.
+        """
+        if full:
+            await self.session.execute(delete(Event).where(Event.user_id == user_id))
+        elif deleted_ids:
+            await self.session.execute(
+                delete(Event).where(Event.user_id == user_id, Event.google_event_id.in_(deleted_ids))
+            )
+        for i in range(0, len(upserts), UPSERT_CHUNK):
+            stmt = insert(Event).values([{**row, "user_id": user_id} for row in upserts[i:i + UPSERT_CHUNK]])
+            await self.session.execute(
+                stmt.on_conflict_do_update(
+                    constraint="uq_events_user_id_google_event_id",
+                    set_={
+                        "title": stmt.excluded.title,
+                        "description": stmt.excluded.description,
+                        "start_datetime": stmt.excluded.start_datetime,
+                        "end_datetime": stmt.excluded.end_datetime,
+                    },
+                )
+            )
+        self.log.debug(
+            f"Зеркало календаря user_id={user_id}: обновлено {len(upserts)}, удалено {len(deleted_ids)}, полная: {full}"
+        )
+        await self._commit()
@@ -1,29 +1,59 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import Session
 from app.models.task import Task
+from app.models.user import User
+from app.db.repositories.calendar_outbox_repo import CalendarOutboxRepository, OPERATION_UPSERT, OPERATION_DELETE
 from app.schemas.task import TaskCreate
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.utils.logger import logger
-from sqlalchemy import and_
+from sqlalchemy import delete, event, func, or_, update
 import datetime as dt
 from datetime import datetime, timedelta
 
+REMIND_BATCH_LIMIT = 1000
+
+# Изменения расписания напоминаний, ждущие коммита сессии
+_SCHEDULE_KEY = "reminder_schedule_changes"
+# Канал LISTEN/NOTIFY, по которому изменения расписания доходят до воркеров других процессов
+SCHEDULE_CHANNEL = "reminder_schedule"
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_schedule_changes(session: Session) -> None:
+    # Импорт внутри функции: планировщик сам зависит от репозитория
+    from app.services.reminder_scheduler import notify_reminder_changed
+    for task_id, fire_at in session.info.pop(_SCHEDULE_KEY, []):
+        notify_reminder_changed(task_id, fire_at)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_schedule_changes(session: Session) -> None:
+    session.info.pop(_SCHEDULE_KEY, None)
+
 
 class TaskRepository:
-    def __init__(self, session: AsyncSession):
+    """
+    autocommit=True — каждый метод коммитит сам.
+    autocommit=False — методы только flush-ят, а вызывающий код коммитит
+    один раз в конце (unit of work).
+    """
+
+    def __init__(self, session: AsyncSession, autocommit: bool = True):
         self.session = session
+        self.autocommit = autocommit
         self.log = logger("TaskRepository")
 
+    async def _commit(self) -> None:
+        if self.autocommit:
+            await self.session.commit()
+        else:
+            await self.session.flush()
+
     async def create_task(self, user_id: int, task_in: TaskCreate) -> Task:
         self.log.debug(f"Создание задачи для user_id={user_id}, данные: {task_in}")
 
-        due_dt = task_in.datetime.isoformat() if isinstance(task_in.datetime, dt.datetime) else task_in.datetime
-        remind_at = None
-        
-        if isinstance(task_in.remind_at, dt.datetime):
-            remind_at = task_in.remind_at.isoformat()
-        else:
-            remind_at = task_in.remind_at
+        due_dt = self._as_utc(task_in.datetime)
         task = Task(
             user_id=user_id,
             description=task_in.description,
@@ -32,17 +62,37 @@ class TaskRepository:
             status=task_in.status,
             google_event_id=task_in.google_event_id,
             duration=task_in.duration,
+            fire_at=self._calc_fire_at(due_dt, task_in.remind_at),
             isReminded=False
         )
         self.session.add(task)
-        await self.session.commit()
-        await self.session.refresh(task)
+        # id приходит из INSERT ... RETURNING, остальные поля уже заданы — refresh не нужен
+        await self.session.flush()
+        # Без напоминания планировщику сообщать нечего — лишний NOTIFY не шлём
+        if task.fire_at is not None:
+            await self._notify_schedule(task.id, task.fire_at)
+        # Событие в Google Calendar создаст воркер синхронизации после коммита
+        CalendarOutboxRepository(self.session).add(task.id, user_id, OPERATION_UPSERT)
+        await self._commit()
         self.log.debug(f"Задача создана: {task}")
         return task
 
-    async def get_tasks_by_user(self, user_id: int) -> List[Task]:
+    async def get_tasks_by_user(
+        self,
+        user_id: int,
+        due_from: Optional[datetime] = None,
+        due_to: Optional[datetime] = None,
+    ) -> List[Task]:
+        """Задачи пользователя по сроку (без срока — в конце); due_from/due_to фильтруют срок."""
         self.log.debug(f"Получение задач пользователя user_id={user_id}")
-        result = await self.session.execute(select(Task).where(Task.user_id == user_id))
+        query = select(Task).where(Task.user_id == user_id)
+        if due_from is not None:
+            query = query.where(Task.due_datetime >= self._as_utc(due_from))
+        if due_to is not None:
+            query = query.where(Task.due_datetime < self._as_utc(due_to))
+        result = await self.session.execute(
+            query.order_by(Task.due_datetime.asc().nulls_last(), Task.id)
+        )
         tasks = list(result.scalars().all())
         self.log.debug(f"Найдено задач: {len(tasks)}")
         return tasks
@@ -54,67 +104,205 @@ class TaskRepository:
         self.log.debug(f"Результат: {task}")
         return task
 
-    async def delete_task(self, task_id: int) -> None:
+    async def get_tasks_by_ids(self, task_ids: List[int]) -> List[Task]:
+        if not task_ids:
+            return []
+        result = await self.session.execute(select(Task).where(Task.id.in_(task_ids)))
+        return list(result.scalars().all())
+
+    async def get_unsynced_tasks(self, user_id: int) -> List[Task]:
+        """Задачи пользователя со сроком, ещё не попавшие в Google Calendar."""
+        result = await self.session.execute(
+            select(Task).where(
+                Task.user_id == user_id,
+                Task.due_datetime != None,
+                Task.google_event_id == None,
+            )
+        )
+        return list(result.scalars().all())
+
+    async def delete_task(self, task_id: int, user_id: Optional[int] = None) -> Optional[Task]:
+        """
+        Удаляет задачу одним DELETE ... RETURNING.
+        Если передан user_id, удаляется только задача этого пользователя.
+        Возвращает удалённую задачу (например, ради google_event_id) или None.
+        """
         self.log.debug(f"Удаление задачи id={task_id}")
-        task = await self.get_task(task_id)
-        if task:
-            await self.session.delete(task)
-            await self.session.commit()
-            self.log.debug(f"Задача удалена: {task_id}")
-        else:
+        conditions = [Task.id == task_id]
+        if user_id is not None:
+            conditions.append(Task.user_id == user_id)
+        result = await self.session.execute(
+            delete(Task)
+            .where(*conditions)
+            .returning(Task)
+            .execution_options(synchronize_session=False)
+        )
+        task = result.scalars().first()
+        if task is None:
             self.log.debug(f"Задача для удаления не найдена: {task_id}")
+            return None
+        if task.fire_at is not None:
+            await self._notify_schedule(task_id, None)
+        CalendarOutboxRepository(self.session).add(task_id, task.user_id, OPERATION_DELETE, task.google_event_id)
+        await self._commit()
+        self.log.debug(f"Задача удалена: {task_id}")
+        return task
 
-    async def update_task_google_event_id(self, task_id: str, google_event_id: str) -> None:
-        self.log.debug(f"Обновление google_event_id для задачи id={task_id}")
-        task = await self.get_task(task_id)
-        if task:
-            task.google_event_id = google_event_id
-            await self.session.commit()
-            await self.session.refresh(task)
-            self.log.debug(f"google_event_id обновлён для задачи id={task_id}")
-        else:
-            self.log.debug(f"Задача для обновления google_event_id не найдена: {task_id}")
+    async def set_google_event_ids(self, event_ids: Dict[int, str]) -> None:
+        """Записывает google_event_id многим задачам одним bulk UPDATE по первичному ключу."""
+        if not event_ids:
+            return
+        self.log.debug(f"Обновление google_event_id для задач: {len(event_ids)} шт.")
+        await self.session.execute(
+            update(Task),
+            [{"id": task_id, "google_event_id": event_id} for task_id, event_id in event_ids.items()],
+        )
+        await self._commit()
+
+    @staticmethod
+    def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+        """Наивный datetime считается UTC (так хранились старые строковые даты)."""
+        if value is None:
+            return None
+        return value if value.tzinfo else value.replace(tzinfo=dt.timezone.utc)
+
+    @classmethod
+    def _calc_fire_at(cls, due_datetime, remind_at, now=None) -> Optional[datetime]:
+        """
+        Момент отправки напоминания: due_datetime - remind_at минут.
+        Если этот момент уже прошёл, а срок ещё нет — напоминание уходит сразу (now).
+        Для прошедших задач напоминание не планируется.
+        """
+        if not due_datetime or remind_at is None:
+            return None
+        due = cls._as_utc(due_datetime)
+        now = now or datetime.now(dt.timezone.utc)
+        if due <= now:
+            return None
+        return max(due - timedelta(minutes=int(remind_at)), now)
 
     @staticmethod
-    def _to_utc(dt_str):
-        """Преобразует строку ISO в datetime с tzinfo=UTC."""
-        from datetime import datetime, timezone
-        dt = datetime.fromisoformat(dt_str)
-        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    def _due_reminder_filter(now_aware: datetime):
+        # Скан ограничен сроком задачи, а не давностью fire_at: напоминание,
+        # пропущенное во время простоя воркеров, уходит, пока задача не наступила
+        return (
+            Task.fire_at != None,
+            Task.isReminded == False,
+            Task.fire_at <= now_aware,
+            Task.due_datetime > now_aware,
+        )
 
-    async def get_tasks_to_remind(self, now) -> List[Task]:
+    async def claim_due_reminders(
+        self,
+        worker_id: str,
+        now,
+        lease: timedelta,
+        limit: int = REMIND_BATCH_LIMIT,
+    ) -> List[tuple[Task, int]]:
         """
-        Возвращает задачи, для которых пора отправить напоминание.
-        now — datetime (желательно с tzinfo=UTC)
+        Забирает в аренду пачку наступивших напоминаний для воркера worker_id.
+        Строки, заблокированные или арендованные другими воркерами, пропускаются
+        (FOR UPDATE SKIP LOCKED); аренда истекает через lease, после чего строку
+        может забрать другой воркер. Возвращает пары (задача, telegram_id).
         """
-        from datetime import timedelta, timezone
-        self.log.debug(f"Получение задач для напоминания на {now}")
+        now_aware = now if now.tzinfo else now.replace(tzinfo=dt.timezone.utc)
+        self.log.debug(f"Аренда напоминаний воркером {worker_id} на {now_aware}")
+        candidates = (
+            select(Task.id)
+            .where(
+                *self._due_reminder_filter(now_aware),
+                or_(Task.lease_expires_at == None, Task.lease_expires_at <= now_aware),
+            )
+            .order_by(Task.fire_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
         result = await self.session.execute(
-            select(Task).where(
-                Task.due_datetime != None,
-                Task.remind_at != None,
-                Task.isReminded == False
+            update(Task)
+            .where(Task.id.in_(candidates.scalar_subquery()), User.id == Task.user_id)
+            .values(lease_owner=worker_id, lease_expires_at=now_aware + lease)
+            .returning(Task, User.telegram_id)
+            .execution_options(synchronize_session=False)
+        )
+        due = [(task, telegram_id) for task, telegram_id in result.all() if telegram_id]
+        await self.session.commit()
+        self.log.debug(f"Воркер {worker_id} арендовал напоминаний: {len(due)}")
+        return due
+
+    async def release_reminder_leases(
+        self, task_ids: List[int], worker_id: str, retry_at: datetime
+    ) -> None:
+        """Возвращает неотправленные напоминания: их можно забрать снова после retry_at."""
+        if not task_ids:
+            return
+        self.log.debug(f"Воркер {worker_id} возвращает напоминания: {len(task_ids)} шт.")
+        await self.session.execute(
+            update(Task)
+            .where(Task.id.in_(task_ids), Task.lease_owner == worker_id)
+            .values(lease_owner=None, lease_expires_at=retry_at)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+
+    async def get_upcoming_reminders(
+        self,
+        now,
+        horizon: timedelta,
+        limit: int = REMIND_BATCH_LIMIT,
+    ) -> List[tuple[int, datetime]]:
+        """
+        Возвращает (id, fire_at) неотправленных напоминаний до now + horizon,
+        включая просроченные у ещё не наступивших задач. Отсортировано по fire_at.
+        """
+        now_aware = now if now.tzinfo else now.replace(tzinfo=dt.timezone.utc)
+        self.log.debug(f"Загрузка расписания напоминаний до {now_aware + horizon}")
+        result = await self.session.execute(
+            select(Task.id, Task.fire_at)
+            .where(
+                Task.fire_at != None,
+                Task.isReminded == False,
+                Task.fire_at <= now_aware + horizon,
+                Task.due_datetime > now_aware,
             )
+            .order_by(Task.fire_at)
+            .limit(limit)
         )
-        tasks = list(result.scalars().all())
-        now_aware = now if now.tzinfo else now.replace(tzinfo=timezone.utc)
-        filtered = []
-        for task in tasks:
-            try:
-                due = self._to_utc(task.due_datetime)
-                remind_time = due - timedelta(minutes=int(task.remind_at))
-                if remind_time <= now_aware < due:
-                    filtered.append(task)
-            except Exception as e:
-                self.log.debug(f"Ошибка при вычислении времени напоминания для задачи {task.id}: {e}")
-        self.log.debug(f"Найдено задач для напоминания: {len(filtered)}")
-        return filtered
-
-    async def mark_task_reminded(self, task_id: int) -> None:
-        self.log.debug(f"Помечаю задачу как напомненную: id={task_id}")
-        task = await self.get_task(task_id)
-        if task:
-            task.isReminded = True
-            await self.session.commit()
-            await self.session.refresh(task)
-            self.log.debug(f"Задача помечена как напомненная: id={task_id}")
\ No newline at end of file
+        return [(row.id, row.fire_at) for row in result]
+
+    async def _notify_schedule(self, task_id: int, fire_at: Optional[datetime]) -> None:
+        # Планировщик узнает об изменении только после коммита: иначе он может
+        # проснуться раньше, чем строка станет видна другим соединениям.
+        # Свой процесс будит хук after_commit, остальные — NOTIFY (Postgres
+        # доставляет его тоже только при коммите транзакции)
+        self.session.info.setdefault(_SCHEDULE_KEY, []).append((task_id, fire_at))
+        payload = f"{task_id} {fire_at.isoformat() if fire_at else ''}"
+        await self.session.execute(select(func.pg_notify(SCHEDULE_CHANNEL, payload)))
+
+    async def extend_reminder_leases(self, task_ids: List[int], worker_id: str, until: datetime) -> None:
+        """Продлевает аренду напоминаний, которые воркер ещё отправляет."""
+        if not task_ids:
+            return
+        await self.session.execute(
+            update(Task)
+            .where(Task.id.in_(task_ids), Task.lease_owner == worker_id, Task.isReminded == False)
+            .values(lease_expires_at=until)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+
+    async def mark_tasks_reminded(self, task_ids: List[int]) -> None:
+        """
+        Помечает задачи напомненными одним UPDATE и снимает аренду.
+        Владельца аренды не проверяем: сообщение уже ушло, и даже если аренда
+        успела истечь, строку нельзя оставлять неотправленной — иначе повтор.
+        """
+        if not task_ids:
+            return
+        self.log.debug(f"Помечаю задачи как напомненные: {len(task_ids)} шт.")
+        await self.session.execute(
+            update(Task)
+            .where(Task.id.in_(task_ids))
+            .values(isReminded=True, lease_owner=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
@@ -0,0 +1,38 @@
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.models.transcript import Transcript
+from typing import Optional
+from app.utils.logger import logger
+
+
+class TranscriptRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.log = logger("TranscriptRepository")
+
+    async def get_by_file_id(self, file_unique_id: str) -> Optional[Transcript]:
+        result = await self.session.execute(
+            select(Transcript).where(Transcript.file_unique_id == file_unique_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def get_by_hash(self, content_hash: str) -> Optional[Transcript]:
+        result = await self.session.execute(
+            select(Transcript).where(Transcript.content_hash == content_hash)
+        )
+        return result.scalar_one_or_none()
+
+    async def save(self, content_hash: str, file_unique_id: Optional[str], text: str) -> None:
+        """
+        Сохраняет текст по хэшу одним upsert. Если запись уже есть (то же аудио
+        прислали другим файлом), дописывает file_unique_id, когда его ещё нет.
+        """
+        stmt = insert(Transcript).values(content_hash=content_hash, file_unique_id=file_unique_id, text=text)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Transcript.content_hash],
+            set_={"file_unique_id": stmt.excluded.file_unique_id},
+            where=Transcript.file_unique_id == None,
+        )
+        await self.session.execute(stmt)
+        await self.session.commit()
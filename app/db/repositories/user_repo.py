@@ -1,9 +1,31 @@
+import datetime as dt
+from sqlalchemy import inspect as sa_inspect, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import make_transient_to_detached
+from app.config import settings
 from app.models.user import User
-from typing import Optional
+from typing import Any, List, Optional, Tuple
+from app.utils.cache import TTLCache
 from app.utils.logger import logger
 
+# telegram_id -> отсоединённый снимок строки users.
+# Снимки никогда не меняются: в сессию попадает копия через merge()
+_user_cache: TTLCache[int, User] = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+
+
+def invalidate_user_cache(telegram_id: int) -> None:
+    _user_cache.pop(telegram_id)
+
+
+def _snapshot(user: User) -> User:
+    """Отсоединённая копия загруженных колонок пользователя для кэша."""
+    columns = {attr.key: getattr(user, attr.key) for attr in sa_inspect(User).column_attrs}
+    copy = User(**columns)
+    make_transient_to_detached(copy)
+    return copy
+
 
 class UserRepository:
     def __init__(self, session: AsyncSession):
@@ -13,18 +35,96 @@ class UserRepository:
     async def get_or_create_user(
         self, telegram_id: int, name: Optional[str] = None
     ) -> User:
-        self.log.debug(f"Поиск пользователя telegram_id={telegram_id}")
-        result = await self.session.execute(
-            select(User).where(User.telegram_id == telegram_id)
+        cached = _user_cache.get(telegram_id)
+        if cached is not None:
+            # Привязываем копию к сессии без SELECT
+            return await self.session.merge(cached, load=False)
+        self.log.debug(f"Пользователь telegram_id={telegram_id} не в кэше, upsert")
+        # Атомарно: одновременные первые сообщения не создадут дубликат и не упадут на unique
+        stmt = (
+            insert(User)
+            .values(telegram_id=telegram_id, name=name)
+            .on_conflict_do_update(
+                index_elements=[User.telegram_id],
+                set_={"telegram_id": telegram_id},
+            )
+            .returning(User)
         )
-        user = result.scalars().first()
-        if user:
-            self.log.debug(f"Пользователь найден: {user}")
-            return user
-        self.log.debug(f"Пользователь не найден, создаю нового: telegram_id={telegram_id}, name={name}")
-        user = User(telegram_id=telegram_id, name=name)
-        self.session.add(user)
+        result = await self.session.execute(stmt, execution_options={"populate_existing": True})
+        user = result.scalars().one()
         await self.session.commit()
-        await self.session.refresh(user)
-        self.log.debug(f"Пользователь создан: {user}")
+        _user_cache.set(telegram_id, _snapshot(user))
+        self.log.debug(f"Пользователь получен: {user}")
         return user
+
+    async def get_user(self, user_id: int) -> Optional[User]:
+        return await self.session.get(User, user_id)
+
+    async def get_users_by_ids(self, user_ids: List[int]) -> List[User]:
+        if not user_ids:
+            return []
+        result = await self.session.execute(select(User).where(User.id.in_(user_ids)))
+        return list(result.scalars().all())
+
+    async def update_user(self, user: User, **fields: Any) -> User:
+        """Меняет поля пользователя (timezone, Google-токены и т.п.) и сбрасывает его кэш."""
+        for key, value in fields.items():
+            setattr(user, key, value)
+        await self.session.commit()
+        invalidate_user_cache(user.telegram_id)
+        return user
+
+    async def save_google_token(self, user_id: int, access_token: str, expiry: Optional[dt.datetime]) -> None:
+        """Сохраняет обновлённый access token одним UPDATE и сбрасывает кэш пользователя."""
+        result = await self.session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(google_access_token=access_token, google_token_expiry=expiry)
+            .returning(User.telegram_id)
+            .execution_options(synchronize_session=False)
+        )
+        telegram_id = result.scalar()
+        await self.session.commit()
+        if telegram_id is not None:
+            invalidate_user_cache(telegram_id)
+
+    async def get_calendar_sync_state(self, user_id: int) -> Tuple[Optional[str], Optional[dt.datetime]]:
+        """(nextSyncToken, время синхронизации) прямо из БД, мимо кэша пользователей."""
+        result = await self.session.execute(
+            select(User.google_sync_token, User.google_synced_at).where(User.id == user_id)
+        )
+        row = result.one_or_none()
+        return (row.google_sync_token, row.google_synced_at) if row else (None, None)
+
+    async def save_channel_failures(self, failures: dict[int, Tuple[int, Optional[dt.datetime]]]) -> None:
+        """
+        Счётчик неудачных регистраций канала и время следующей попытки
+        (user_id -> (failures, retry_at)) одним bulk UPDATE. Кэш не сбрасываем:
+        эти поля читает только продление каналов, и всегда из БД.
+        """
+        if not failures:
+            return
+        await self.session.execute(
+            update(User),
+            [
+                {"id": user_id, "google_channel_failures": count, "google_channel_retry_at": retry_at}
+                for user_id, (count, retry_at) in failures.items()
+            ],
+        )
+        await self.session.commit()
+
+    async def save_calendar_sync_state(
+        self, user_id: int, sync_token: Optional[str], synced_at: Optional[dt.datetime]
+    ) -> None:
+        """Сохраняет состояние зеркала календаря; коммитит и изменения событий в этой же транзакции."""
+        result = await self.session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(google_sync_token=sync_token, google_synced_at=synced_at)
+            .returning(User.telegram_id)
+            .execution_options(synchronize_session=False)
+        )
+        telegram_id = result.scalar()
+        await self.session.commit()
+        if telegram_id is not None:
+            invalidate_user_cache(telegram_id)
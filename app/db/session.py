@@ -1,15 +1,74 @@
+import time
+from uuid import uuid4
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
 from collections.abc import AsyncGenerator
 from app.utils.logger import logger
+from app.utils.metrics import metrics
 
 logger = logger("db-session")
 
+# Размеры пула под тип процесса: бот, FastAPI, отдельный воркер напоминаний
+POOL_PRESETS = {
+    "bot": {"DB_POOL_SIZE": 10, "DB_MAX_OVERFLOW": 10, "DB_POOL_TIMEOUT": 10.0},
+    "api": {"DB_POOL_SIZE": 20, "DB_MAX_OVERFLOW": 10, "DB_POOL_TIMEOUT": 10.0},
+    "worker": {"DB_POOL_SIZE": 3, "DB_MAX_OVERFLOW": 2, "DB_POOL_TIMEOUT": 30.0},
+}
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул, который замеряет ожидание свободного соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe("db.pool_checkout_wait", time.perf_counter() - started)
+
+
+def _pool_settings() -> dict:
+    values = {
+        name: getattr(settings, name)
+        for name in ("DB_POOL_SIZE", "DB_MAX_OVERFLOW", "DB_POOL_TIMEOUT", "DB_POOL_RECYCLE", "DB_POOL_PRE_PING")
+    }
+    if settings.DB_POOL_PRESET:
+        preset = POOL_PRESETS[settings.DB_POOL_PRESET]
+        values.update({k: v for k, v in preset.items() if k not in settings.model_fields_set})
+    return values
+
+
+def _connect_args() -> dict:
+    if not settings.DB_PGBOUNCER:
+        return {}
+    # PgBouncer (transaction pooling) не гарантирует то же серверное соединение
+    # между запросами, поэтому именованные prepared statements не переиспользуем
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+    }
+
+
+pool = _pool_settings()
+
 engine = create_async_engine(
-    settings.DATABASE_URL
+    settings.DATABASE_URL,
+    poolclass=InstrumentedPool,
+    pool_size=pool["DB_POOL_SIZE"],
+    max_overflow=pool["DB_MAX_OVERFLOW"],
+    pool_timeout=pool["DB_POOL_TIMEOUT"],
+    pool_recycle=pool["DB_POOL_RECYCLE"],
+    pool_pre_ping=pool["DB_POOL_PRE_PING"],
+    connect_args=_connect_args(),
 )
 
-logger.info(f"Database engine created")
+
+metrics.register_gauge("db.pool_in_use", engine.pool.checkedout)
+
+
+logger.info(f"Database engine created: pool={pool}, pgbouncer={settings.DB_PGBOUNCER}")
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -1,10 +1,29 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api import tasks, calendar
+from app.config import settings
+from app.services.calendar_push import calendar_push
+from app.utils.http import close_http_session
 from app.utils.logger import logger
+from app.utils.metrics import metrics_reporter
 
 logger = logger("fastapi")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Каналы push-уведомлений календаря регистрирует и продлевает процесс API
+    renewer = asyncio.create_task(calendar_push.run()) if settings.CALENDAR_CHANNEL_WORKER_ENABLED else None
+    reporter = asyncio.create_task(metrics_reporter())
+    yield
+    reporter.cancel()
+    if renewer:
+        renewer.cancel()
+    await close_http_session()
+
+
+app = FastAPI(lifespan=lifespan)
 logger.info("FastAPI app created")
 
 app.include_router(tasks.router)
@@ -1,3 +1,6 @@
 from .user import User
 from .task import Task
-from .event import Event
\ No newline at end of file
+from .event import Event
+from .calendar_outbox import CalendarOutbox
+from .calendar_channel import CalendarChannel
+from .transcript import Transcript
@@ -0,0 +1,22 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import ForeignKey, DateTime
+from typing import Optional
+import datetime as dt
+from app.models.base import Base
+
+
+class CalendarChannel(Base):
+    """
+    Канал push-уведомлений Google Calendar (events.watch) для календаря пользователя.
+    При продлении у пользователя ненадолго бывает два канала: старый останавливается
+    после регистрации нового.
+    """
+
+    __tablename__ = "calendar_channels"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    channel_id: Mapped[str] = mapped_column(unique=True, index=True)
+    resource_id: Mapped[Optional[str]] = mapped_column(nullable=True)
+    # Секрет канала: Google возвращает его в X-Goog-Channel-Token каждого уведомления
+    token: Mapped[str]
+    expiration: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), index=True)
@@ -0,0 +1,31 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import ForeignKey, DateTime, Index, func
+from typing import Optional
+import datetime as dt
+from app.models.base import Base
+
+
+class CalendarOutbox(Base):
+    """
+    Намерение синхронизировать задачу с Google Calendar.
+    Пишется в той же транзакции, что и сама задача; применяет его фоновый воркер.
+    """
+
+    __tablename__ = "calendar_outbox"
+
+    # Без внешнего ключа: строка удаления переживает саму задачу
+    task_id: Mapped[int] = mapped_column(index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    operation: Mapped[str]  # upsert | delete
+    # Для удаления: id события, известный на момент удаления задачи
+    google_event_id: Mapped[Optional[str]] = mapped_column(nullable=True)
+
+    attempts: Mapped[int] = mapped_column(default=0)
+    next_attempt_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    last_error: Mapped[Optional[str]] = mapped_column(nullable=True)
+    lease_owner: Mapped[Optional[str]] = mapped_column(nullable=True)
+    lease_expires_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_calendar_outbox_next_attempt_at", "next_attempt_at"),
+    )
@@ -1,16 +1,26 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import Optional
 from app.models.base import Base
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, DateTime, Index, UniqueConstraint
+import datetime as dt
 
 
 class Event(Base):
+    """Локальное зеркало событий Google Calendar пользователя."""
+
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     title: Mapped[str]
     description: Mapped[Optional[str]]
-    start_datetime: Mapped[str]
-    end_datetime: Mapped[str]
+    start_datetime: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True))
+    end_datetime: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True))
     google_event_id: Mapped[Optional[str]]
 
     user: Mapped["User"] = relationship(back_populates="events") # type: ignore
+
+    __table_args__ = (
+        # Ключ upsert при инкрементальной синхронизации
+        UniqueConstraint("user_id", "google_event_id", name="uq_events_user_id_google_event_id"),
+        # Выборка событий пользователя по диапазону дат
+        Index("ix_events_user_id_start_datetime", "user_id", "start_datetime"),
+    )
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, DateTime, Index, text
 from typing import Optional
+import datetime as dt
 from app.models.base import Base
 
 
@@ -11,11 +12,28 @@ class Task(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     description: Mapped[str]
 
-    due_datetime: Mapped[Optional[str]]
-    remind_at: Mapped[Optional[int]] 
-    duration: Mapped[Optional[int]]  
+    due_datetime: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    remind_at: Mapped[Optional[int]]
+    duration: Mapped[Optional[int]]
 
-    isReminded: Mapped[bool] = mapped_column(default=False)  
+    # Момент отправки напоминания (due_datetime - remind_at), считается при записи задачи
+    fire_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    isReminded: Mapped[bool] = mapped_column(default=False)
+    # Аренда напоминания воркером: кто забрал строку и до какого момента
+    lease_owner: Mapped[Optional[str]] = mapped_column(nullable=True)
+    lease_expires_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     google_event_id: Mapped[Optional[str]]
 
     user = relationship("User", back_populates="tasks")
+
+    __table_args__ = (
+        # Список задач пользователя по сроку и выборки по диапазону дат
+        Index("ix_tasks_user_id_due_datetime", "user_id", "due_datetime"),
+        # Частичный индекс: в нём только ещё не отправленные напоминания
+        Index(
+            "ix_tasks_fire_at_pending",
+            "fire_at",
+            postgresql_where=text('fire_at IS NOT NULL AND "isReminded" = false'),
+        ),
+    )
@@ -0,0 +1,17 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import DateTime, func
+from typing import Optional
+import datetime as dt
+from app.models.base import Base
+
+
+class Transcript(Base):
+    """
+    Распознанный текст голосового сообщения.
+    Ищется по file_unique_id Telegram (пересланные копии) и по sha256 содержимого.
+    """
+
+    content_hash: Mapped[str] = mapped_column(unique=True, index=True)
+    file_unique_id: Mapped[Optional[str]] = mapped_column(unique=True, index=True, nullable=True)
+    text: Mapped[str]
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
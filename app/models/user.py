@@ -1,5 +1,7 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import DateTime
 from typing import List, Optional
+import datetime as dt
 from app.models.base import Base
 
 
@@ -9,7 +11,13 @@ class User(Base):
 
     google_access_token: Mapped[Optional[str]] = mapped_column(nullable=True)
     google_refresh_token: Mapped[Optional[str]] = mapped_column(nullable=True)
-    google_token_expiry: Mapped[Optional[str]] = mapped_column(nullable=True)
+    google_token_expiry: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Состояние зеркала календаря: nextSyncToken Google и время последней синхронизации
+    google_sync_token: Mapped[Optional[str]] = mapped_column(nullable=True)
+    google_synced_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Неудачные регистрации канала push-уведомлений подряд и когда пробовать снова
+    google_channel_failures: Mapped[int] = mapped_column(default=0, server_default="0")
+    google_channel_retry_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
     timezone: Mapped[Optional[str]] = mapped_column(default="+03:00")
 
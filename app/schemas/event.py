@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import Optional
+import datetime as dt
+
+
+class EventOut(BaseModel):
+    id: int
+    user_id: int
+    title: str
+    description: Optional[str] = None
+    start_datetime: dt.datetime
+    end_datetime: dt.datetime
+    google_event_id: Optional[str] = None
+
+    class Config:
+        from_attributes = True
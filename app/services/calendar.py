@@ -1,108 +1,379 @@
-from typing import Optional, List
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional, List, Tuple
 from datetime import datetime
-from app.utils.logger import logger
-from googleapiclient.discovery import build
+from urllib.parse import quote, urlsplit
+import aiohttp
 from google.oauth2.credentials import Credentials
+from app.config import settings
+from app.services.google_auth import credential_manager
+from app.utils.cache import TTLCache
+from app.utils.exceptions import GoogleApiError, GoogleQuotaError, GoogleTransientError, google_api_error
+from app.utils.http import get_http_session
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.rate_limit import TokenBucket
+
+CALENDAR_API_URL = "https://www.googleapis.com/calendar/v3"
+BATCH_API_URL = "https://www.googleapis.com/batch/calendar/v3"
+BATCH_MAX_CALLS = 1000  # предел Google для одного batch-запроса
+MAX_USER_BUCKETS = 10_000  # сколько per-user вёдер держать в памяти
+
+
+def _backoff(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Экспоненциальная задержка с полным jitter; Retry-After от Google важнее."""
+    if retry_after:
+        return min(retry_after, settings.GOOGLE_RETRY_MAX)
+    return random.uniform(0, min(settings.GOOGLE_RETRY_MAX, settings.GOOGLE_RETRY_BASE * 2 ** attempt))
+
+
+class GoogleRateLimiter:
+    """
+    Token bucket на проект (все запросы процесса) и на пользователя под квоты
+    Calendar API. После ответа «квота превышена» соответствующее ведро ставится на паузу.
+    """
+
+    def __init__(
+        self,
+        project_rate: float = settings.GOOGLE_PROJECT_RATE,
+        user_rate: float = settings.GOOGLE_USER_RATE,
+        user_burst: float = settings.GOOGLE_USER_BURST,
+    ):
+        self._project = TokenBucket(project_rate, project_rate)
+        self._user_rate = user_rate
+        self._user_burst = user_burst
+        self._users: "OrderedDict[int, TokenBucket]" = OrderedDict()
+
+    def _user_bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self._user_rate, self._user_burst)
+            self._users[user_id] = bucket
+            # Забываем самых старых пользователей, если их вёдра уже восстановились
+            while len(self._users) > MAX_USER_BUCKETS:
+                old_id, old_bucket = next(iter(self._users.items()))
+                if not old_bucket.idle:
+                    break
+                del self._users[old_id]
+        else:
+            self._users.move_to_end(user_id)
+        return bucket
+
+    async def acquire(self, user_id: Optional[int], tokens: float = 1.0) -> None:
+        """
+        Ждёт tokens токенов в обоих вёдрах. Запрос дороже ёмкости ведра (большой batch)
+        ждёт полного ведра и уходит в долг, который вернут следующие запросы.
+        """
+        while True:
+            user = self._user_bucket(user_id) if user_id is not None else None
+            wait = self._project.delay(min(tokens, self._project.capacity))
+            if user:
+                wait = max(wait, user.delay(min(tokens, user.capacity)))
+            if wait <= 0:
+                self._project.consume(tokens)
+                if user:
+                    user.consume(tokens)
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, user_id: Optional[int], seconds: float, per_user: bool) -> None:
+        if per_user and user_id is not None:
+            self._user_bucket(user_id).pause(seconds)
+        else:
+            self._project.pause(seconds)
+
+
+rate_limiter = GoogleRateLimiter()
+
+
+class BatchCall(NamedTuple):
+    method: str
+    url: str
+    body: Optional[dict] = None
+
+
+class BatchResult(NamedTuple):
+    status: int
+    body: Optional[dict]
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+
+def event_body(
+    description: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    reminder_minutes: Optional[int] = None,
+    event_id: Optional[str] = None,
+) -> dict:
+    """Тело события Calendar API; не заданные поля в него не попадают."""
+    event: dict = {}
+    if event_id is not None:
+        event["id"] = event_id
+    if description is not None:
+        event["summary"] = description
+    if start is not None:
+        event["start"] = {"dateTime": start.isoformat(), "timeZone": "UTC"}
+    if end is not None:
+        event["end"] = {"dateTime": end.isoformat(), "timeZone": "UTC"}
+    if reminder_minutes is not None:
+        event["reminders"] = {
+            "useDefault": False,
+            "overrides": [
+                {"method": "popup", "minutes": reminder_minutes}
+            ]
+        }
+    return event
 
 
 class GoogleCalendarService:
-    def __init__(self, credentials):
+    """
+    Асинхронный клиент Google Calendar API (REST поверх общей aiohttp-сессии).
+    Ни один вызов не блокирует event loop: HTTP идёт через aiohttp,
+    а обновлением токена занимается CredentialManager.
+    """
+
+    def __init__(
+        self,
+        credentials: Credentials,
+        timeout: Optional[float] = None,
+        calendar_id: str = "primary",
+        user_id: Optional[int] = None,
+    ):
         self.credentials = credentials
-        self.service = build("calendar", "v3", credentials=self.credentials)
+        self.user_id = user_id
+        self.timeout = aiohttp.ClientTimeout(total=timeout or settings.GOOGLE_API_TIMEOUT)
+        self.events_url = f"{CALENDAR_API_URL}/calendars/{quote(calendar_id, safe='')}/events"
         self.logger = logger("calendar-service")
 
-    async def create_event(
+    async def _refresh_credentials(self, force: bool = False) -> None:
+        await credential_manager.ensure_fresh(self.user_id, self.credentials, force=force)
+
+    async def _request(
         self,
-        user_id: int,
-        description: str,
-        start: datetime,
-        end: Optional[datetime] = None,
-        reminder_minutes: Optional[int] = None,
-    ) -> str:
+        method: str,
+        url: str,
+        endpoint: str,
+        params: Optional[dict] = None,
+        json: Optional[dict] = None,
+        data: Optional[bytes] = None,
+        headers: Optional[dict] = None,
+        cost: int = 1,
+        idempotent: Optional[bool] = None,
+    ) -> Any:
         """
-        Создаёт событие в Google Calendar.
-        start — начало события (datetime, UTC)
-        end — конец события (datetime, UTC), если не задан — событие считается мгновенным или однодневным
-        reminder_minutes — за сколько минут напомнить (None — не указывать, будет дефолт Google)
+        Общий слой запросов: лимиты проекта и пользователя, повтор после 401
+        с обновлённым токеном, backoff с jitter для квот и временных ошибок,
+        метрики google.<endpoint>.*. cost — сколько вызовов квоты тратит запрос
+        (для batch — число вложенных вызовов). Сетевую ошибку неидемпотентного
+        запроса (по умолчанию — POST) не повторяем: он мог выполниться.
         """
-        self.logger.info(
-            f"Creating event for user {user_id}: {description} {start} - {end}, reminder: {reminder_minutes}"
-        )
-        event = {
-            "summary": description,
-            "start": {
-                "dateTime": start.isoformat(),
-                "timeZone": "UTC",
-            },
-            "end": {
-                "dateTime": (end or start).isoformat(),
-                "timeZone": "UTC",
-            },
-        }
-        if reminder_minutes is not None:
-            event["reminders"] = {
-                "useDefault": False,
-                "overrides": [
-                    {"method": "popup", "minutes": reminder_minutes}
-                ]
-            }
-        created_event = self.service.events().insert(
-            calendarId="primary", body=event
-        ).execute()
-        return created_event["id"]
-
-    async def update_event(
-        self,
-        google_event_id: str,
-        description: Optional[str] = None,
-        start: Optional[datetime] = None,
-        end: Optional[datetime] = None,
-    ) -> None:
-        self.logger.info(
-            f"Updating event {google_event_id}: {description} {start} - {end}"
+        if idempotent is None:
+            idempotent = method != "POST"
+        await self._refresh_credentials()
+        refreshed = False
+        attempt = 0
+        while True:
+            await rate_limiter.acquire(self.user_id, cost)
+            request_headers = {**(headers or {}), "Authorization": f"Bearer {self.credentials.token}"}
+            started = time.perf_counter()
+            try:
+                async with get_http_session().request(
+                    method, url, params=params, json=json, data=data, headers=request_headers, timeout=self.timeout
+                ) as resp:
+                    metrics.observe(f"google.{endpoint}.latency", time.perf_counter() - started)
+                    if resp.status == 401 and not refreshed and self.credentials.refresh_token:
+                        # Токен протух раньше, чем мы узнали об этом по expiry
+                        refreshed = True
+                        await self._refresh_credentials(force=True)
+                        continue
+                    if resp.status < 400:
+                        if resp.status == 204:
+                            return None
+                        if resp.content_type.startswith("multipart/"):
+                            return resp.headers["Content-Type"], await resp.read()
+                        return await resp.json(content_type=None)
+                    error = await self._error(resp)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                metrics.observe(f"google.{endpoint}.latency", time.perf_counter() - started)
+                error = GoogleTransientError(0, f"{type(e).__name__}: {e}")
+                if not idempotent:
+                    metrics.inc(f"google.{endpoint}.errors.{error.kind}")
+                    raise error from e
+            metrics.inc(f"google.{endpoint}.errors.{error.kind}")
+            if not error.retryable or attempt >= settings.GOOGLE_MAX_RETRIES:
+                raise error
+            delay = _backoff(attempt, error.retry_after)
+            attempt += 1
+            metrics.inc(f"google.{endpoint}.retries")
+            self.logger.warning(f"{endpoint}: {error}, повтор {attempt} через {delay:.1f} с")
+            if isinstance(error, GoogleQuotaError):
+                # Притормаживаем всех, кто упирается в ту же квоту, а не только этот запрос
+                rate_limiter.pause(self.user_id, delay, per_user=error.per_user)
+            else:
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _error(resp: aiohttp.ClientResponse) -> GoogleApiError:
+        retry_after = resp.headers.get("Retry-After")
+        retry_after = float(retry_after) if retry_after and retry_after.isdigit() else None
+        try:
+            error = (await resp.json(content_type=None)).get("error", {})
+            message = error.get("message") or resp.reason
+            errors = error.get("errors") or [{}]
+            reason = errors[0].get("reason")
+        except Exception:
+            message, reason = await resp.text(), None
+        return google_api_error(resp.status, message, reason, retry_after)
+
+    def event_url(self, google_event_id: Optional[str] = None) -> str:
+        if google_event_id is None:
+            return self.events_url
+        return f"{self.events_url}/{quote(google_event_id, safe='')}"
+
+    def insert_call(self, body: dict) -> BatchCall:
+        return BatchCall("POST", self.event_url(), body)
+
+    def patch_call(self, google_event_id: str, body: dict) -> BatchCall:
+        """Частичное обновление: уходят только поля body, остальные поля события не трогаем."""
+        return BatchCall("PATCH", self.event_url(google_event_id), body)
+
+    def delete_call(self, google_event_id: str) -> BatchCall:
+        return BatchCall("DELETE", self.event_url(google_event_id))
+
+    async def batch(
+        self, calls: List[BatchCall], batch_size: Optional[int] = None, idempotent: bool = True
+    ) -> List[BatchResult]:
+        """
+        Выполняет вызовы через batch-эндпоинт Calendar API пачками до batch_size
+        (GOOGLE_BATCH_SIZE, не больше BATCH_MAX_CALLS). Результаты — в порядке calls;
+        ошибки отдельных вызовов возвращаются статусом, а не исключением.
+        idempotent=False — среди вызовов есть вставка без своего id: после сетевой
+        ошибки пачку не повторяем, иначе событие может появиться дважды.
+        """
+        size = min(batch_size or settings.GOOGLE_BATCH_SIZE, BATCH_MAX_CALLS)
+        results: List[BatchResult] = []
+        for i in range(0, len(calls), size):
+            results.extend(await self._send_batch(calls[i:i + size], idempotent))
+        return results
+
+    async def _send_batch(self, calls: List[BatchCall], idempotent: bool = True) -> List[BatchResult]:
+        self.logger.info(f"Batch request: {len(calls)} calls")
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for i, call in enumerate(calls):
+            url = urlsplit(call.url)
+            path = url.path + (f"?{url.query}" if url.query else "")
+            part = (
+                f"--{boundary}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: <item{i}>\r\n\r\n"
+                f"{call.method} {path} HTTP/1.1\r\n"
+            )
+            if call.body is not None:
+                part += f"Content-Type: application/json\r\n\r\n{json.dumps(call.body)}\r\n"
+            else:
+                part += "\r\n"
+            parts.append(part)
+        payload = ("".join(parts) + f"--{boundary}--\r\n").encode()
+        content_type, body = await self._request(
+            "POST",
+            BATCH_API_URL,
+            "batch",
+            data=payload,
+            headers={"Content-Type": f"multipart/mixed; boundary={boundary}"},
+            cost=len(calls),
+            idempotent=idempotent,
         )
-        event = self.service.events().get(
-            calendarId="primary", eventId=google_event_id
-        ).execute()
-        if description is not None:
-            event["summary"] = description
-        if start is not None:
-            event["start"] = {
-                "dateTime": start.isoformat(),
-                "timeZone": "UTC",
-            }
-        if end is not None:
-            event["end"] = {
-                "dateTime": end.isoformat(),
-                "timeZone": "UTC",
-            }
-        self.service.events().update(
-            calendarId="primary", eventId=google_event_id, body=event
-        ).execute()
-
-    async def delete_event(self, google_event_id: str) -> None:
-        self.logger.info(f"Deleting event {google_event_id}")
-        self.service.events().delete(
-            calendarId="primary", eventId=google_event_id
-        ).execute()
-
-    async def get_events(
-        self,
-        user_id: int,
-        time_min: Optional[datetime] = None,
-        time_max: Optional[datetime] = None,
-    ) -> List[dict]:
-        self.logger.info(
-            f"Getting events for user {user_id} from {time_min} to {time_max}"
+        return _parse_batch_response(content_type, body, len(calls))
+
+    async def list_event_changes(self, sync_token: Optional[str] = None) -> Tuple[List[dict], str, Optional[str]]:
+        """
+        Изменения событий с момента sync_token (без него — полный список).
+        Возвращает (события, nextSyncToken, часовой пояс календаря); удалённые
+        события приходят со status="cancelled". Протухший sync_token — GoogleApiError 410.
+        """
+        self.logger.info(f"Listing event changes for user {self.user_id}, incremental: {sync_token is not None}")
+        # Параметры полной и инкрементальной выборки должны совпадать;
+        # timeMin/orderBy вместе с syncToken Google не принимает
+        params = {"singleEvents": "true", "maxResults": "2500"}
+        if sync_token:
+            params["syncToken"] = sync_token
+        items: List[dict] = []
+        while True:
+            page = await self._request("GET", self.events_url, "events.list", params=params)
+            items.extend(page.get("items", []))
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return items, page["nextSyncToken"], page.get("timeZone")
+            params["pageToken"] = page_token
+
+    async def watch_events(self, channel_id: str, address: str, token: str, ttl: Optional[int] = None) -> dict:
+        """
+        Регистрирует канал push-уведомлений об изменениях событий (events.watch).
+        Ответ содержит resourceId и expiration (мс с эпохи) — Google может сократить ttl.
+        """
+        self.logger.info(f"Watching events for user {self.user_id}, channel {channel_id}")
+        body: dict = {"id": channel_id, "type": "web_hook", "address": address, "token": token}
+        if ttl:
+            body["params"] = {"ttl": str(ttl)}
+        return await self._request("POST", f"{self.events_url}/watch", "events.watch", json=body)
+
+    async def stop_channel(self, channel_id: str, resource_id: str) -> None:
+        self.logger.info(f"Stopping channel {channel_id} for user {self.user_id}")
+        await self._request(
+            "POST",
+            f"{CALENDAR_API_URL}/channels/stop",
+            "channels.stop",
+            json={"id": channel_id, "resourceId": resource_id},
+            idempotent=True,
         )
-        params = {
-            "calendarId": "primary",
-            "singleEvents": True,
-            "orderBy": "startTime",
-        }
-        if time_min:
-            params["timeMin"] = time_min.isoformat()
-        if time_max:
-            params["timeMax"] = time_max.isoformat()
-        events_result = self.service.events().list(**params).execute()
-        return events_result.get("items", [])
+
+
+# (user_id, refresh_token) -> сервис поверх Credentials из CredentialManager
+_services: TTLCache[tuple, GoogleCalendarService] = TTLCache(
+    maxsize=settings.CALENDAR_SERVICE_CACHE_SIZE, ttl=settings.CALENDAR_SERVICE_CACHE_TTL
+)
+
+
+def get_calendar_service(user) -> Optional[GoogleCalendarService]:
+    """Сервис календаря пользователя из кэша; None, если Google не подключён."""
+    if not (user.google_access_token and user.google_refresh_token and user.google_token_expiry):
+        return None
+    credentials = credential_manager.get_credentials(user)
+    key = (user.id, user.google_refresh_token)
+    service = _services.get(key)
+    if service is None or service.credentials is not credentials:
+        service = GoogleCalendarService(credentials, user_id=user.id)
+        _services.set(key, service)
+    return service
+
+
+def _parse_batch_response(content_type: str, body: bytes, count: int) -> List[BatchResult]:
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not match:
+        raise GoogleApiError(500, "Batch response without boundary")
+    boundary = match.group(1)
+    results: List[Optional[BatchResult]] = [None] * count
+    text = body.decode("utf-8", errors="replace").replace("\r\n", "\n")
+    for part in text.split(f"--{boundary}")[1:]:
+        if part.startswith("--"):
+            break
+        outer, _, inner = part.strip("\n").partition("\n\n")
+        content_id = re.search(r"Content-ID:\s*<response-item(\d+)>", outer, re.IGNORECASE)
+        if not content_id:
+            continue
+        status_line, _, rest = inner.partition("\n")
+        _, _, payload = rest.partition("\n\n")
+        status = int(status_line.split()[1])
+        payload = payload.strip()
+        results[int(content_id.group(1))] = BatchResult(status, json.loads(payload) if payload else None)
+    # Вызов без ответа считаем временной ошибкой
+    return [result or BatchResult(503, None) for result in results]
@@ -0,0 +1,118 @@
+import asyncio
+import datetime as dt
+import weakref
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from app.config import settings
+from app.db.session import get_session
+from app.db.repositories.event_repo import EventRepository
+from app.db.repositories.user_repo import UserRepository
+from app.services.calendar import get_calendar_service
+from app.utils.exceptions import GoogleApiError
+from app.utils.logger import logger
+
+UNTITLED = "(без названия)"
+
+
+def _utcnow() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+def _zone(name: Optional[str]) -> dt.tzinfo:
+    try:
+        return ZoneInfo(name) if name else dt.timezone.utc
+    except (ZoneInfoNotFoundError, ValueError):
+        return dt.timezone.utc
+
+
+def _parse_time(value: dict, tz: dt.tzinfo) -> Optional[dt.datetime]:
+    """dateTime события или полночь даты целодневного события в поясе календаря."""
+    if value.get("dateTime"):
+        return dt.datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+    if value.get("date"):
+        return dt.datetime.combine(dt.date.fromisoformat(value["date"]), dt.time.min, tzinfo=tz)
+    return None
+
+
+def split_changes(items: List[dict], tz: dt.tzinfo) -> Tuple[List[dict], List[str]]:
+    """Ответ events.list -> (строки events для upsert, id удалённых событий)."""
+    # Последнее изменение события побеждает: в одном INSERT ключ должен быть уникален
+    changes: dict = {}
+    for item in items:
+        if item.get("status") == "cancelled":
+            changes[item["id"]] = None
+            continue
+        start = _parse_time(item.get("start", {}), tz)
+        if start is None:
+            continue
+        end = _parse_time(item.get("end", {}), tz) or start
+        changes[item["id"]] = {
+            "google_event_id": item["id"],
+            "title": item.get("summary") or UNTITLED,
+            "description": item.get("description"),
+            "start_datetime": start,
+            "end_datetime": end,
+        }
+    upserts = [row for row in changes.values() if row is not None]
+    deleted = [event_id for event_id, row in changes.items() if row is None]
+    return upserts, deleted
+
+
+class CalendarMirror:
+    """
+    Зеркало Google Calendar в таблице events.
+    Синхронизация инкрементальная по nextSyncToken: из Google приходят только
+    изменённые и удалённые события. Протухший токен (410) — полная ресинхронизация.
+    Чтение календаря (бот, API) идёт из БД.
+    """
+
+    def __init__(self, max_age: float = settings.CALENDAR_MIRROR_MAX_AGE):
+        self.max_age = dt.timedelta(seconds=max_age)
+        self._locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.log = logger("calendar-mirror")
+
+    def _lock(self, user_id: int) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[user_id] = lock
+        return lock
+
+    async def sync(self, user, max_age: Optional[dt.timedelta] = None) -> bool:
+        """
+        Догоняет зеркало пользователя. max_age — не синхронизировать, если
+        зеркало моложе. Одновременные вызовы для одного пользователя ждут один
+        запрос к Google. False — Google Calendar не подключён.
+        """
+        service = get_calendar_service(user)
+        if service is None:
+            return False
+        async with self._lock(user.id):
+            async for session in get_session():
+                sync_token, synced_at = await UserRepository(session).get_calendar_sync_state(user.id)
+            if max_age is not None and synced_at is not None and _utcnow() - synced_at < max_age:
+                return True
+            try:
+                items, next_token, time_zone = await service.list_event_changes(sync_token)
+            except GoogleApiError as e:
+                if e.status != 410 or sync_token is None:
+                    raise
+                self.log.info(f"syncToken пользователя {user.id} протух, полная ресинхронизация")
+                sync_token = None
+                items, next_token, time_zone = await service.list_event_changes()
+            upserts, deleted = split_changes(items, _zone(time_zone))
+            async for session in get_session():
+                await EventRepository(session, autocommit=False).apply_changes(
+                    user.id, upserts, deleted, full=sync_token is None
+                )
+                # Токен и события коммитятся вместе: изменения не потеряются при падении
+                await UserRepository(session).save_calendar_sync_state(user.id, next_token, _utcnow())
+            self.log.debug(f"Календарь пользователя {user.id}: изменений {len(items)}")
+            return True
+
+    async def ensure_fresh(self, user) -> bool:
+        """Синхронизирует зеркало, только если оно старше max_age."""
+        return await self.sync(user, max_age=self.max_age)
+
+
+calendar_mirror = CalendarMirror()
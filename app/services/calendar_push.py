@@ -0,0 +1,191 @@
+import asyncio
+import datetime as dt
+import secrets
+import uuid
+from typing import Dict, Optional
+from app.config import settings
+from app.db.session import get_session
+from app.db.repositories.calendar_channel_repo import CalendarChannelRepository
+from app.db.repositories.user_repo import UserRepository
+from app.services.calendar import get_calendar_service
+from app.services.calendar_mirror import calendar_mirror
+from app.utils.exceptions import GoogleApiError
+from app.utils.logger import logger
+
+RENEW_INTERVAL = 600  # секунд между проверками каналов
+MAX_REGISTER_BACKOFF = dt.timedelta(days=1)  # предел паузы после неудачных регистраций
+
+# Результат разбора уведомления
+NOTIFICATION_ACCEPTED = "accepted"
+NOTIFICATION_UNKNOWN = "unknown"
+NOTIFICATION_FORBIDDEN = "forbidden"
+
+
+def _utcnow() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+def _register_backoff(failures: int) -> dt.timedelta:
+    return min(dt.timedelta(seconds=RENEW_INTERVAL * 2 ** (failures - 1)), MAX_REGISTER_BACKOFF)
+
+
+class CalendarPushManager:
+    """
+    Push-уведомления Google Calendar вместо опроса.
+    - register/unregister: канал events.watch на календарь пользователя;
+    - handle_notification: уведомление от Google будит инкрементальную
+      синхронизацию зеркала только этого пользователя; пачка уведомлений
+      за debounce секунд даёт одну синхронизацию;
+    - run(): фоновое продление истекающих каналов и регистрация недостающих.
+    """
+
+    def __init__(
+        self,
+        address: str = settings.GOOGLE_WEBHOOK_URL,
+        ttl: int = settings.CALENDAR_CHANNEL_TTL,
+        renew_margin: int = settings.CALENDAR_CHANNEL_RENEW_MARGIN,
+        debounce: float = settings.CALENDAR_PUSH_DEBOUNCE,
+    ):
+        self.address = address
+        self.ttl = ttl
+        self.renew_margin = dt.timedelta(seconds=renew_margin)
+        self.debounce = debounce
+        # user_id -> отложенная синхронизация
+        self._pending: Dict[int, asyncio.Task] = {}
+        self.log = logger("calendar-push")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.address)
+
+    async def register(self, user) -> bool:
+        """Регистрирует новый канал пользователя; False — push выключен или Google не подключён."""
+        service = get_calendar_service(user)
+        if not self.enabled or service is None:
+            return False
+        channel_id = uuid.uuid4().hex
+        token = secrets.token_urlsafe(32)
+        response = await service.watch_events(channel_id, self.address, token, ttl=self.ttl)
+        expiration = (
+            dt.datetime.fromtimestamp(int(response["expiration"]) / 1000, dt.timezone.utc)
+            if response.get("expiration")
+            else _utcnow() + dt.timedelta(seconds=self.ttl)
+        )
+        async for session in get_session():
+            await CalendarChannelRepository(session).add(
+                user.id, channel_id, response.get("resourceId"), token, expiration
+            )
+        self.log.info(f"Канал {channel_id} пользователя {user.id} зарегистрирован до {expiration}")
+        return True
+
+    async def _stop(self, service, channels) -> None:
+        for channel in channels:
+            if service is None or not channel.resource_id:
+                continue
+            try:
+                await service.stop_channel(channel.channel_id, channel.resource_id)
+            except GoogleApiError as e:
+                # 404 — канал уже истёк; остальное не мешает: уведомления без строки канала игнорируются
+                if e.status != 404:
+                    self.log.warning(f"Не удалось остановить канал {channel.channel_id}: {e}")
+
+    async def unregister(self, user) -> None:
+        """Останавливает все каналы пользователя (до отключения Google, пока токены живы)."""
+        async for session in get_session():
+            repo = CalendarChannelRepository(session)
+            channels = await repo.get_by_user(user.id)
+            await session.commit()
+            await self._stop(get_calendar_service(user), channels)
+            await repo.delete([channel.channel_id for channel in channels])
+
+    async def handle_notification(self, channel_id: str, resource_state: str, token: Optional[str]) -> str:
+        async for session in get_session():
+            channel = await CalendarChannelRepository(session).get_by_channel_id(channel_id)
+        if channel is None:
+            return NOTIFICATION_UNKNOWN
+        if not token or not secrets.compare_digest(token, channel.token):
+            return NOTIFICATION_FORBIDDEN
+        # "sync" — подтверждение регистрации канала, изменений ещё нет
+        if resource_state != "sync":
+            self.schedule_sync(channel.user_id)
+        return NOTIFICATION_ACCEPTED
+
+    def schedule_sync(self, user_id: int) -> None:
+        if user_id in self._pending:
+            # Синхронизация уже запланирована и заберёт и это изменение
+            return
+        self._pending[user_id] = asyncio.create_task(self._sync_later(user_id))
+
+    async def _sync_later(self, user_id: int) -> None:
+        try:
+            await asyncio.sleep(self.debounce)
+        finally:
+            # Уведомления, пришедшие во время синхронизации, запланируют следующую
+            self._pending.pop(user_id, None)
+        try:
+            async for session in get_session():
+                user = await UserRepository(session).get_user(user_id)
+            if user is not None:
+                await calendar_mirror.sync(user)
+        except Exception as e:
+            self.log.exception(f"Ошибка синхронизации календаря пользователя {user_id} по уведомлению: {e}")
+
+    async def renew(self, now: dt.datetime) -> None:
+        """Продлевает истекающие каналы и регистрирует каналы пользователям без них."""
+        async for session in get_session():
+            repo = CalendarChannelRepository(session)
+            expiring = await repo.get_expiring(now + self.renew_margin, now)
+            users = {
+                user.id: user
+                for user in await UserRepository(session).get_users_by_ids(
+                    list({channel.user_id for channel in expiring})
+                )
+            }
+            missing = await repo.get_users_without_channel(now)
+            await session.commit()
+            renewed = set()
+            # user_id -> (неудач подряд, следующая попытка); успех сбрасывает счётчик
+            failures = {}
+            for user in [*users.values(), *missing]:
+                try:
+                    registered = await self.register(user)
+                    error = "Google не подключён"
+                except Exception as e:
+                    registered, error = False, e
+                if registered:
+                    renewed.add(user.id)
+                    if user.google_channel_failures:
+                        failures[user.id] = (0, None)
+                    continue
+                # Отказ без исключения тоже неудача: иначе пользователь без бэкоффа
+                # снова окажется в начале выборки
+                count = user.google_channel_failures + 1
+                failures[user.id] = (count, now + _register_backoff(count))
+                self.log.warning(
+                    f"Не удалось зарегистрировать канал пользователя {user.id} (неудач подряд: {count}): {error}"
+                )
+            await UserRepository(session).save_channel_failures(failures)
+            # Старые каналы останавливаем после регистрации новых, чтобы не пропустить изменения;
+            # не продлённые доживают свой срок
+            stale = [
+                channel for channel in expiring
+                if channel.user_id in renewed or channel.expiration <= now
+            ]
+            for channel in stale:
+                user = users.get(channel.user_id)
+                await self._stop(get_calendar_service(user) if user else None, [channel])
+            await repo.delete([channel.channel_id for channel in stale])
+
+    async def run(self, interval: float = RENEW_INTERVAL) -> None:
+        if not self.enabled:
+            self.log.info("GOOGLE_WEBHOOK_URL не задан, push-уведомления календаря выключены")
+            return
+        while True:
+            try:
+                await self.renew(_utcnow())
+            except Exception as e:
+                self.log.exception(f"Ошибка продления каналов календаря: {e}")
+            await asyncio.sleep(interval)
+
+
+calendar_push = CalendarPushManager()
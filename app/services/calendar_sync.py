@@ -0,0 +1,300 @@
+import asyncio
+import datetime as dt
+import os
+import random
+import socket
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from app.db.session import get_session
+from app.db.repositories.calendar_outbox_repo import (
+    CalendarOutboxRepository,
+    OUTBOX_BATCH_LIMIT,
+    OPERATION_DELETE,
+)
+from app.db.repositories.task_repo import TaskRepository
+from app.db.repositories.user_repo import UserRepository
+from app.services.calendar import BatchResult, GoogleCalendarService, event_body, get_calendar_service
+from app.utils.exceptions import GoogleApiError, google_api_error
+from app.utils.logger import logger
+
+POLL_INTERVAL = 30  # секунд; записи из других процессов подхватываются опросом
+LEASE_DURATION = dt.timedelta(minutes=2)
+MAX_ATTEMPTS = 10
+RETRY_BASE = 5  # секунд, удваивается с каждой попыткой
+RETRY_MAX = 3600
+CONCURRENCY = 10  # пользователей, синхронизируемых одновременно
+EVENT_ID_PREFIX = "assistanttask"  # только base32hex-символы (a-v, 0-9)
+
+_worker: Optional["CalendarSyncWorker"] = None
+
+
+def _utcnow() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+def calendar_event_id(task_id: int) -> str:
+    """Детерминированный id события задачи: повторная отправка не создаст дубликат."""
+    return f"{EVENT_ID_PREFIX}{task_id}"
+
+
+def calendar_sync_note(user) -> str:
+    """Строка для ответа пользователю после записи задачи."""
+    if user.google_access_token and user.google_refresh_token:
+        return "Событие будет добавлено в Google Календарь."
+    return "Нет авторизации Google. Выполните /google."
+
+
+def _retry_delay(attempts: int) -> dt.timedelta:
+    delay = min(RETRY_BASE * 2 ** attempts, RETRY_MAX)
+    return dt.timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def _task_event(task, event_id: Optional[str] = None, now: Optional[dt.datetime] = None) -> dict:
+    """
+    Тело события задачи. now задаётся при вставке: задача без срока попадает
+    в календарь на момент первой синхронизации, а при обновлении её время не трогаем.
+    """
+    start = task.due_datetime or now
+    end = start + dt.timedelta(minutes=task.duration) if start and task.duration else start
+    reminder = int(task.remind_at) if task.remind_at is not None else None
+    return event_body(task.description, start, end, reminder, event_id)
+
+
+def _batch_error(result: BatchResult) -> GoogleApiError:
+    error = (result.body or {}).get("error", {})
+    reason = (error.get("errors") or [{}])[0].get("reason")
+    return google_api_error(result.status, error.get("message", "batch call failed"), reason)
+
+
+async def sync_tasks_batch(
+    service: GoogleCalendarService,
+    upserts: List,
+    deletes: Dict[int, str],
+) -> Tuple[Dict[int, str], Dict[int, GoogleApiError]]:
+    """
+    Создаёт/обновляет события задач upserts и удаляет события deletes (task_id -> event_id)
+    batch-запросами. Известные события обновляются PATCH (только поля задачи:
+    правки других полей события в календаре сохраняются), новые вставляются
+    с детерминированным id. Второй batch-запрос разбирает расхождения: 409 при
+    вставке («уже есть») превращается в PATCH, 404/410 при PATCH (событие удалили
+    в календаре) — во вставку с новым id от Google, 404/410 при удалении — успех.
+    Возвращает (task_id -> event_id для upserts, task_id -> ошибка).
+    """
+    now = _utcnow()
+    calls = [
+        service.patch_call(task.google_event_id, _task_event(task))
+        if task.google_event_id
+        else service.insert_call(_task_event(task, calendar_event_id(task.id), now))
+        for task in upserts
+    ]
+    calls += [service.delete_call(event_id) for event_id in deletes.values()]
+    results = await service.batch(calls) if calls else []
+
+    event_ids: Dict[int, str] = {}
+    errors: Dict[int, GoogleApiError] = {}
+    retries, retry_calls = [], []
+    for task, result in zip(upserts, results):
+        if result.ok:
+            event_ids[task.id] = task.google_event_id or calendar_event_id(task.id)
+        elif result.status == 409 and not task.google_event_id:
+            # Событие уже есть — приводим его к текущему состоянию задачи
+            retries.append((task, calendar_event_id(task.id)))
+            retry_calls.append(service.patch_call(calendar_event_id(task.id), _task_event(task)))
+        elif result.status in (404, 410) and task.google_event_id:
+            # Событие удалили в календаре. Id удалённого события Google повторно
+            # не принимает (вставка с ним даст 409) — новый id выдаст сам Google
+            retries.append((task, None))
+            retry_calls.append(service.insert_call(_task_event(task, now=now)))
+        else:
+            errors[task.id] = _batch_error(result)
+    for task_id, result in zip(deletes, results[len(upserts):]):
+        if not result.ok and result.status not in (404, 410):
+            errors[task_id] = _batch_error(result)
+
+    if retry_calls:
+        idempotent = all(event_id is not None for _, event_id in retries)
+        for (task, event_id), result in zip(retries, await service.batch(retry_calls, idempotent=idempotent)):
+            if result.ok:
+                event_ids[task.id] = event_id or result.body["id"]
+            else:
+                errors[task.id] = _batch_error(result)
+    return event_ids, errors
+
+
+class CalendarSyncWorker:
+    """
+    Применяет записи calendar_outbox к Google Calendar.
+    Записи одной задачи схлопываются: выполняется только последняя операция
+    (upsert читает актуальное состояние задачи). Операции идемпотентны
+    (см. sync_tasks_batch), задачи одного пользователя идут одним batch-запросом.
+    """
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.log = logger("calendar-sync")
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def _sync_user(self, user, task_ids: list, by_task: dict, tasks: dict):
+        service = get_calendar_service(user) if user else None
+        if service is None:
+            # Google не подключён — синхронизировать нечего
+            return {}, {}
+        upserts, deletes = [], {}
+        for task_id in task_ids:
+            rows = by_task.get(task_id)
+            if rows and rows[-1].operation == OPERATION_DELETE:
+                event_id = next((row.google_event_id for row in rows if row.google_event_id), None)
+                deletes[task_id] = event_id or calendar_event_id(task_id)
+            elif task_id in tasks:
+                upserts.append(tasks[task_id])
+            # Иначе задача уже удалена, а запись об удалении ещё не забрана — её и дождёмся
+        async with self._semaphore:
+            return await sync_tasks_batch(service, upserts, deletes)
+
+    async def _process(self, now: dt.datetime) -> int:
+        async for session in get_session():
+            outbox = CalendarOutboxRepository(session)
+            rows = await outbox.claim(self.worker_id, now, LEASE_DURATION)
+            if not rows:
+                return 0
+            by_task: dict[int, list] = defaultdict(list)
+            for row in rows:
+                by_task[row.task_id].append(row)
+            by_user: dict[int, list] = defaultdict(list)
+            for task_id, task_rows in by_task.items():
+                by_user[task_rows[-1].user_id].append(task_id)
+            tasks = {
+                task.id: task
+                for task in await TaskRepository(session).get_tasks_by_ids(list(by_task))
+            }
+            users = {
+                user.id: user
+                for user in await UserRepository(session).get_users_by_ids(list(by_user))
+            }
+            # Не держим соединение в транзакции, пока идут запросы к Google
+            await session.commit()
+            # Задачи одного пользователя уходят одним batch-запросом
+            user_ids = list(by_user)
+            results = await asyncio.gather(
+                *(self._sync_user(users.get(user_id), by_user[user_id], by_task, tasks) for user_id in user_ids),
+                return_exceptions=True,
+            )
+            event_ids, errors = {}, {}
+            for user_id, result in zip(user_ids, results):
+                if isinstance(result, Exception):
+                    errors.update({task_id: result for task_id in by_user[user_id]})
+                else:
+                    event_ids.update(result[0])
+                    errors.update(result[1])
+            await self._finish(session, outbox, now, by_task, tasks, event_ids, errors)
+            self.log.debug(f"Синхронизировано задач: {len(by_task)}, записей outbox: {len(rows)}")
+            return len(rows)
+
+    async def sync_user(self, user) -> Tuple[Dict[int, str], Dict[int, GoogleApiError]]:
+        """
+        Синхронизация одного пользователя по запросу: его записи outbox
+        (изменённые и удалённые задачи) и задачи со сроком, ещё не попавшие
+        в календарь. Синхронизированные и неизменённые задачи не отправляются.
+        """
+        now = _utcnow()
+        async for session in get_session():
+            outbox = CalendarOutboxRepository(session)
+            rows = await outbox.claim(self.worker_id, now, LEASE_DURATION, user_id=user.id)
+            by_task: dict[int, list] = defaultdict(list)
+            for row in rows:
+                by_task[row.task_id].append(row)
+            repo = TaskRepository(session)
+            tasks = {task.id: task for task in await repo.get_tasks_by_ids(list(by_task))}
+            for task in await repo.get_unsynced_tasks(user.id):
+                tasks.setdefault(task.id, task)
+            task_ids = list(by_task) + [task_id for task_id in tasks if task_id not in by_task]
+            # Не держим соединение в транзакции, пока идут запросы к Google
+            await session.commit()
+            try:
+                event_ids, errors = await self._sync_user(user, task_ids, by_task, tasks)
+            except Exception as e:
+                event_ids, errors = {}, {task_id: e for task_id in task_ids}
+            await self._finish(session, outbox, now, by_task, tasks, event_ids, errors)
+            return event_ids, errors
+
+    async def _finish(self, session, outbox, now, by_task, tasks, event_ids, errors) -> None:
+        """Записывает id событий задачам, закрывает записи outbox или откладывает их повтор."""
+        done = []
+        for task_id, task_rows in by_task.items():
+            ids = [row.id for row in task_rows]
+            error = errors.get(task_id)
+            if error is None:
+                done.extend(ids)
+                continue
+            attempts = max(row.attempts for row in task_rows) + 1
+            if attempts >= MAX_ATTEMPTS:
+                self.log.error(f"Синхронизация задачи {task_id} с Google Calendar не удалась, попыток: {attempts}: {error}")
+                done.extend(ids)
+            else:
+                self.log.warning(f"Синхронизация задачи {task_id} с Google Calendar, попытка {attempts}: {error}")
+                await outbox.retry(ids, self.worker_id, now + _retry_delay(attempts), repr(error))
+        changed = {
+            task_id: event_id
+            for task_id, event_id in event_ids.items()
+            if tasks[task_id].google_event_id != event_id
+        }
+        await TaskRepository(session, autocommit=False).set_google_event_ids(changed)
+        await outbox.complete(done, self.worker_id)
+        # id событий задач без записей outbox (sync_user) коммитим сами
+        await session.commit()
+
+    async def _next_wake(self) -> float:
+        async for session in get_session():
+            next_at = await CalendarOutboxRepository(session).next_attempt_at()
+        if next_at is None:
+            return POLL_INTERVAL
+        return min(max((next_at - _utcnow()).total_seconds(), 0), POLL_INTERVAL)
+
+    async def run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            timeout = POLL_INTERVAL
+            try:
+                processed = await self._process(_utcnow())
+                # Полная пачка — сразу за следующей
+                timeout = 0 if processed >= OUTBOX_BATCH_LIMIT else await self._next_wake()
+            except Exception as e:
+                self.log.exception(f"Ошибка в воркере синхронизации календаря: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+def notify_calendar_sync() -> None:
+    """Будит воркер этого процесса, если он запущен."""
+    if _worker is not None:
+        _worker.notify()
+
+
+async def calendar_sync_worker() -> None:
+    global _worker
+    _worker = CalendarSyncWorker()
+    try:
+        await _worker.run()
+    finally:
+        _worker = None
+
+
+async def _run_worker():
+    from app.utils.http import close_http_session
+    try:
+        await calendar_sync_worker()
+    finally:
+        await close_http_session()
+
+
+# Отдельный воркер синхронизации (можно запускать в нескольких экземплярах):
+# uv run -m app.services.calendar_sync
+if __name__ == "__main__":
+    asyncio.run(_run_worker())
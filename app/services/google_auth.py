@@ -1,6 +1,13 @@
+import asyncio
+import weakref
 from google_auth_oauthlib.flow import Flow
+from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from typing import Optional
+import datetime as dt
 from app.config import settings
+from app.utils.cache import TTLCache
+from app.utils.logger import logger
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
@@ -37,7 +44,7 @@ def fetch_tokens(flow: Flow, code: str) -> Credentials:
 def build_credentials(
     access_token: str,
     refresh_token: str,
-    expiry: str,
+    expiry: Optional[dt.datetime],
 ) -> Credentials:
     return Credentials(
         token=access_token,
@@ -46,4 +53,101 @@ def build_credentials(
         client_id=settings.GOOGLE_CLIENT_ID,
         client_secret=settings.GOOGLE_CLIENT_SECRET,
         scopes=SCOPES,
-    ) 
\ No newline at end of file
+        # google-auth сравнивает expiry с наивным UTC
+        expiry=expiry.astimezone(dt.timezone.utc).replace(tzinfo=None) if expiry else None,
+    )
+
+
+class CredentialManager:
+    """
+    Живые Credentials пользователей в памяти процесса.
+    - одно обновление токена на пользователя: конкурентные запросы ждут его под общим lock;
+    - обновлённый access token и expiry сохраняются в users;
+    - фоновая задача run() обновляет токены заранее, до истечения.
+    """
+
+    def __init__(
+        self,
+        margin: float = settings.GOOGLE_TOKEN_REFRESH_MARGIN,
+        maxsize: int = settings.CALENDAR_SERVICE_CACHE_SIZE,
+        ttl: float = settings.CALENDAR_SERVICE_CACHE_TTL,
+    ):
+        self.margin = dt.timedelta(seconds=margin)
+        # user_id -> Credentials; refresh_token сверяется, чтобы заметить переподключение
+        self._credentials: TTLCache[int, Credentials] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.log = logger("credential-manager")
+
+    def get_credentials(self, user) -> Optional[Credentials]:
+        if not (user.google_access_token and user.google_refresh_token):
+            return None
+        credentials = self._credentials.get(user.id)
+        if credentials is None or credentials.refresh_token != user.google_refresh_token:
+            credentials = build_credentials(
+                access_token=user.google_access_token,
+                refresh_token=user.google_refresh_token,
+                expiry=user.google_token_expiry,
+            )
+            self._credentials.set(user.id, credentials)
+        return credentials
+
+    def forget(self, user_id: int) -> None:
+        self._credentials.pop(user_id)
+
+    def _expires_soon(self, credentials: Credentials) -> bool:
+        if not credentials.token:
+            return True
+        if credentials.expiry is None:
+            return False
+        return credentials.expiry - self.margin <= dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+
+    def _lock(self, user_id: int) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[user_id] = lock
+        return lock
+
+    async def ensure_fresh(self, user_id: int, credentials: Credentials, force: bool = False) -> None:
+        """
+        Обновляет токен, если он скоро истечёт (или force — например, после 401).
+        Пока один запрос обновляет токен, остальные ждут и получают уже новый.
+        """
+        stale_token = credentials.token
+        if not force and not self._expires_soon(credentials):
+            return
+        async with self._lock(user_id):
+            # Пока ждали lock, токен мог обновить другой запрос
+            if credentials.token != stale_token or (not force and not self._expires_soon(credentials)):
+                return
+            self.log.info(f"Обновление Google токена пользователя {user_id}")
+            # google-auth обновляет токен синхронным HTTP-запросом
+            await asyncio.to_thread(credentials.refresh, Request())
+            await self._persist(user_id, credentials)
+
+    async def _persist(self, user_id: int, credentials: Credentials) -> None:
+        # Импорт внутри метода: репозиторий пользователей тянет за собой движок БД
+        from app.db.session import AsyncSessionLocal
+        from app.db.repositories.user_repo import UserRepository
+        expiry = credentials.expiry.replace(tzinfo=dt.timezone.utc) if credentials.expiry else None
+        try:
+            async with AsyncSessionLocal() as session:
+                await UserRepository(session).save_google_token(user_id, credentials.token, expiry)
+        except Exception as e:
+            # Токен в памяти уже рабочий; в БД попадёт при следующем обновлении
+            self.log.exception(f"Не удалось сохранить Google токен пользователя {user_id}: {e}")
+
+    async def run(self, interval: float = 60.0) -> None:
+        """Фоновое обновление токенов активных пользователей до истечения."""
+        while True:
+            await asyncio.sleep(interval)
+            for user_id, credentials in list(self._credentials.items()):
+                if not self._expires_soon(credentials):
+                    continue
+                try:
+                    await self.ensure_fresh(user_id, credentials)
+                except Exception as e:
+                    self.log.warning(f"Фоновое обновление токена пользователя {user_id} не удалось: {e}")
+
+
+credential_manager = CredentialManager()
\ No newline at end of file
@@ -27,10 +27,8 @@ class DeleteTaskTool(BaseTool):
     async def _arun(self, user_id: int, task_id: int, **kwargs) -> Any:
         async for session in get_session():
             repo = TaskRepository(session)
-            task = await repo.get_task(task_id)
-            if not task or task.user_id != user_id:
+            if not await repo.delete_task(task_id, user_id=user_id):
                 return {"ok": False, "error": "Task not found or not owned by user"}
-            await repo.delete_task(task_id)
             return {"ok": True}
 
     def _run(self, *args, **kwargs):
@@ -1,31 +1,246 @@
 import asyncio
 import datetime as dt
+import heapq
+import os
+import socket
+import uuid
+from collections import defaultdict
+from typing import Optional
+import asyncpg
+from sqlalchemy.engine import make_url
 from app.db.session import get_session
-from app.db.repositories.task_repo import TaskRepository
-from app.db.repositories.user_repo import UserRepository
+from app.db.repositories.task_repo import TaskRepository, REMIND_BATCH_LIMIT, SCHEDULE_CHANNEL
+from app.utils.logger import logger
+from app.config import settings
 from aiogram import Bot
-from aiogram.types import Message
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from app.services.telegram_sender import TelegramSender
 
-CHECK_INTERVAL = 60  # секунд между проверками
+REFILL_INTERVAL = 300  # секунд между подгрузками расписания из БД
+POLL_INTERVAL = 5  # подгрузка расписания, пока нет LISTEN: изменения других процессов не приходят
+LISTEN_RETRY_DELAY = 5  # пауза перед переподключением LISTEN
+HORIZON = dt.timedelta(seconds=REFILL_INTERVAL * 2)  # с запасом, чтобы окна перекрывались
+RETRY_DELAY = dt.timedelta(seconds=30)  # повтор неотправленного напоминания
+LEASE_DURATION = dt.timedelta(minutes=2)  # после падения воркера пачку заберёт другой
+REMINDERS_PER_MESSAGE = 50  # задач в одном сообщении (лимит Telegram — 100 кнопок)
+MESSAGE_TEXT_LIMIT = 4096
+BUTTON_TEXT_LIMIT = 60
 
-async def reminder_scheduler(bot: Bot):
-    while True:
-        now = dt.datetime.now()
+_scheduler: Optional["ReminderScheduler"] = None
+
+
+def _utcnow() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+def _as_utc(value: dt.datetime) -> dt.datetime:
+    return value if value.tzinfo else value.replace(tzinfo=dt.timezone.utc)
+
+
+def build_reminder_message(tasks: list) -> tuple[str, InlineKeyboardMarkup]:
+    """Текст и клавиатура одного сообщения с напоминаниями (кнопка на каждую задачу)."""
+    if len(tasks) == 1:
+        text = f"⏰ Напоминание: {tasks[0].description}"
+    else:
+        text = "⏰ Напоминания:\n" + "\n".join(f"• {task.description}" for task in tasks)
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=f"❌ {task.description[:BUTTON_TEXT_LIMIT]}", callback_data=f"delete_task_{task.id}")]
+            for task in tasks
+        ]
+    )
+    return text[:MESSAGE_TEXT_LIMIT], keyboard
+
+
+class ReminderScheduler:
+    """
+    Держит ближайшие напоминания в min-heap и спит ровно до следующего.
+    Из БД подгружается только окно [now, now + HORIZON]; изменения расписания
+    приходят через notify() и будят цикл сразу: из этого процесса — после
+    коммита сессии, из других (бот, API, соседние воркеры) — через LISTEN/NOTIFY.
+    Пока LISTEN не подключён, окно перечитывается каждые POLL_INTERVAL секунд.
+    """
+
+    def __init__(self, bot: Bot, sender: TelegramSender, worker_id: Optional[str] = None):
+        self.bot = bot
+        self.sender = sender
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.log = logger("reminder-scheduler")
+        self._heap: list[tuple[dt.datetime, int]] = []
+        self._wakeup = asyncio.Event()
+        self._loaded_until: Optional[dt.datetime] = None
+        self._next_refill: Optional[dt.datetime] = None
+        self._listening = False
+
+    def notify(self, task_id: int, fire_at: Optional[dt.datetime]) -> None:
+        """Сообщает об изменении расписания задачи (создание, удаление)."""
+        if fire_at is not None:
+            fire_at = _as_utc(fire_at)
+            # Дальше загруженного окна не кладём — подхватит следующая подгрузка
+            if self._loaded_until is not None and fire_at <= self._loaded_until:
+                heapq.heappush(self._heap, (fire_at, task_id))
+        self._wakeup.set()
+
+    def _on_notification(self, connection, pid, channel, payload: str) -> None:
+        task_id, _, fire_at = payload.partition(" ")
+        try:
+            self.notify(int(task_id), dt.datetime.fromisoformat(fire_at) if fire_at else None)
+        except ValueError:
+            self.log.warning(f"Некорректное уведомление о расписании: {payload!r}")
+
+    async def listen(self) -> None:
+        """LISTEN изменений расписания из других процессов; переподключается при обрыве."""
+        url = make_url(settings.REMINDER_LISTEN_DATABASE_URL or settings.DATABASE_URL)
+        dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            try:
+                connection = await asyncpg.connect(dsn)
+            except Exception as e:
+                self.log.warning(f"LISTEN {SCHEDULE_CHANNEL} недоступен, опрос каждые {POLL_INTERVAL} с: {e}")
+                await asyncio.sleep(LISTEN_RETRY_DELAY)
+                continue
+            closed = asyncio.Event()
+            connection.add_termination_listener(lambda _: closed.set())
+            try:
+                await connection.add_listener(SCHEDULE_CHANNEL, self._on_notification)
+                self._listening = True
+                # Изменения, пропущенные без подписки, подхватит внеочередная подгрузка
+                self._next_refill = None
+                self._wakeup.set()
+                await closed.wait()
+                self.log.warning(f"Соединение LISTEN {SCHEDULE_CHANNEL} закрыто, переподключение")
+            except Exception as e:
+                self.log.warning(f"Ошибка LISTEN {SCHEDULE_CHANNEL}: {e}")
+            finally:
+                self._listening = False
+                await connection.close()
+            await asyncio.sleep(LISTEN_RETRY_DELAY)
+
+    async def _refill(self, now: dt.datetime) -> None:
+        async for session in get_session():
+            repo = TaskRepository(session)
+            rows = await repo.get_upcoming_reminders(now, HORIZON)
+        self._heap = [(_as_utc(fire_at), task_id) for task_id, fire_at in rows]
+        heapq.heapify(self._heap)
+        self._loaded_until = now + HORIZON
+        self._next_refill = now + dt.timedelta(seconds=REFILL_INTERVAL if self._listening else POLL_INTERVAL)
+        if len(rows) >= REMIND_BATCH_LIMIT:
+            # Окно не поместилось целиком — догрузим, когда дойдём до последнего загруженного
+            self._loaded_until = _as_utc(rows[-1][1])
+            self._next_refill = min(self._next_refill, self._loaded_until)
+        self.log.debug(f"Загружено напоминаний: {len(self._heap)} до {self._loaded_until}")
+
+    async def _deliver(self, now: dt.datetime) -> None:
         async for session in get_session():
             repo = TaskRepository(session)
-            user_repo = UserRepository(session)
-            # Получаем задачи, у которых remind_at <= сейчас и статус не "reminded"
-            tasks = await repo.get_tasks_to_remind(now)
-            for task in tasks:
-                user = await user_repo.get_user_by_id(task.user_id)
-                if user and user.telegram_id:
-                    try:
-                        await bot.send_message(user.telegram_id, f"⏰ Напоминание: {task.description}")
-                        await repo.mark_task_reminded(task.id)
-                    except Exception as e:
-                        print(f"Ошибка отправки напоминания: {e}")
-        await asyncio.sleep(CHECK_INTERVAL)
-
-# Для запуска планировщика в main.py:
-# from app.services.reminder_scheduler import reminder_scheduler
-# asyncio.create_task(reminder_scheduler(bot)) 
\ No newline at end of file
+            # Забираем пачку в аренду: параллельные воркеры получат другие строки
+            due = await repo.claim_due_reminders(self.worker_id, now, LEASE_DURATION)
+            # Все напоминания одного пользователя за тик — одним сообщением
+            by_chat: dict[int, list] = defaultdict(list)
+            for task, telegram_id in due:
+                by_chat[telegram_id].append(task)
+            messages = [
+                (telegram_id, tasks[i:i + REMINDERS_PER_MESSAGE])
+                for telegram_id, tasks in by_chat.items()
+                for i in range(0, len(tasks), REMINDERS_PER_MESSAGE)
+            ]
+            # Ставим всю пачку в очередь отправки: она сама сгладит всплеск по лимитам
+            sends = []
+            for telegram_id, tasks in messages:
+                text, keyboard = build_reminder_message(tasks)
+                sends.append(self.sender.send_message(telegram_id, text, reply_markup=keyboard))
+            # Большая пачка может отправляться дольше аренды: продлеваем её, пока идёт отправка
+            heartbeat = asyncio.create_task(self._extend_leases([task.id for task, _ in due]))
+            try:
+                results = await asyncio.gather(*sends, return_exceptions=True)
+            finally:
+                heartbeat.cancel()
+            delivered, failed = [], []
+            for (telegram_id, tasks), result in zip(messages, results):
+                ids = [task.id for task in tasks]
+                if isinstance(result, Exception):
+                    self.log.error(f"Ошибка отправки напоминаний {ids} в чат {telegram_id}: {result}")
+                    failed.extend(ids)
+                else:
+                    delivered.extend(ids)
+            await repo.mark_tasks_reminded(delivered)
+            # Неотправленные остаются isReminded=False и уйдут повторно
+            await repo.release_reminder_leases(failed, self.worker_id, now + RETRY_DELAY)
+            for task_id in failed:
+                heapq.heappush(self._heap, (now + RETRY_DELAY, task_id))
+            self.log.debug(f"Напоминаний отправлено: {len(delivered)} из {len(due)}")
+
+    async def _extend_leases(self, task_ids: list[int]) -> None:
+        while True:
+            await asyncio.sleep(LEASE_DURATION.total_seconds() / 3)
+            try:
+                async for session in get_session():
+                    await TaskRepository(session).extend_reminder_leases(
+                        task_ids, self.worker_id, _utcnow() + LEASE_DURATION
+                    )
+            except Exception as e:
+                self.log.warning(f"Не удалось продлить аренду напоминаний: {e}")
+
+    async def run(self) -> None:
+        listener = asyncio.create_task(self.listen())
+        try:
+            await self._loop()
+        finally:
+            listener.cancel()
+
+    async def _loop(self) -> None:
+        while True:
+            # Сбрасываем флаг до чтения кучи, чтобы не потерять notify()
+            self._wakeup.clear()
+            now = _utcnow()
+            try:
+                if self._next_refill is None or now >= self._next_refill:
+                    await self._refill(now)
+                if self._heap and self._heap[0][0] <= now:
+                    while self._heap and self._heap[0][0] <= now:
+                        heapq.heappop(self._heap)
+                    await self._deliver(now)
+            except Exception as e:
+                self.log.exception(f"Ошибка в планировщике напоминаний: {e}")
+                self._next_refill = now + dt.timedelta(seconds=REFILL_INTERVAL if self._listening else POLL_INTERVAL)
+
+            next_wake = self._next_refill
+            if self._heap:
+                next_wake = min(next_wake, self._heap[0][0])
+            timeout = max((next_wake - _utcnow()).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+def notify_reminder_changed(task_id: int, fire_at: Optional[dt.datetime] = None) -> None:
+    """Будит планировщик этого процесса, если он запущен."""
+    if _scheduler is not None:
+        _scheduler.notify(task_id, fire_at)
+
+
+async def reminder_scheduler(bot: Bot, sender: Optional[TelegramSender] = None):
+    global _scheduler
+    sender = sender or TelegramSender(bot)
+    _scheduler = ReminderScheduler(bot, sender)
+    try:
+        await _scheduler.run()
+    finally:
+        _scheduler = None
+
+
+async def _run_worker():
+    bot = Bot(token=settings.TELEGRAM_TOKEN)
+    sender = TelegramSender(bot)
+    try:
+        await reminder_scheduler(bot, sender)
+    finally:
+        await sender.stop()
+        await bot.session.close()
+
+
+# Отдельный воркер напоминаний (можно запускать в нескольких экземплярах):
+# uv run -m app.services.reminder_scheduler
+if __name__ == "__main__":
+    asyncio.run(_run_worker())
@@ -0,0 +1,224 @@
+import asyncio
+import contextvars
+import itertools
+import time
+from collections import OrderedDict
+from enum import IntEnum
+from typing import Any, Optional
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramServerError
+from app.config import settings
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.rate_limit import TokenBucket
+
+MAX_CHAT_BUCKETS = 10_000  # сколько per-chat вёдер держать в памяти
+MAX_SEND_ATTEMPTS = 5  # для сетевых ошибок и 5xx; retry_after не считается попыткой
+RETRY_BACKOFF = 1.0  # секунд, умножается на номер попытки
+
+# Выставляется воркером очереди: лимит уже получен, middleware не должна брать его ещё раз
+_limit_acquired: contextvars.ContextVar[bool] = contextvars.ContextVar("telegram_limit_acquired", default=False)
+
+
+class SenderStoppedError(Exception):
+    """Очередь отправки остановлена раньше, чем сообщение ушло."""
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # ответы пользователю в хендлерах
+    BULK = 1  # напоминания и прочие рассылки
+
+
+class TelegramRateLimiter:
+    """
+    Глобальный и per-chat token bucket под лимиты Telegram.
+    Пока ждут интерактивные запросы, массовые не получают токенов.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = settings.TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = settings.TELEGRAM_CHAT_RATE,
+        chat_burst: float = settings.TELEGRAM_CHAT_BURST,
+    ):
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._chats: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._interactive_waiting = 0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self._chat_rate, self._chat_burst)
+            self._chats[chat_id] = bucket
+            # Забываем самые старые чаты, если их вёдра уже восстановились
+            while len(self._chats) > MAX_CHAT_BUCKETS:
+                old_id, old_bucket = next(iter(self._chats.items()))
+                if not old_bucket.idle:
+                    break
+                del self._chats[old_id]
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def acquire(self, chat_id: Optional[int], priority: Priority) -> None:
+        interactive = priority == Priority.INTERACTIVE
+        if interactive:
+            self._interactive_waiting += 1
+        try:
+            while True:
+                chat = self._chat_bucket(chat_id) if chat_id is not None else None
+                wait = max(self._global.delay(), chat.delay() if chat else 0.0)
+                if not interactive and self._interactive_waiting:
+                    # Уступаем интерактивным запросам
+                    wait = max(wait, 0.05)
+                if wait <= 0:
+                    self._global.consume()
+                    if chat:
+                        chat.consume()
+                    return
+                await asyncio.sleep(wait)
+        finally:
+            if interactive:
+                self._interactive_waiting -= 1
+
+    def pause(self, chat_id: Optional[int], seconds: float) -> None:
+        """Учитывает retry_after от Telegram: для чата или для всего бота."""
+        if chat_id is not None:
+            self._chat_bucket(chat_id).pause(seconds)
+        else:
+            self._global.pause(seconds)
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Request-middleware для Bot: все запросы с chat_id (ответы хендлеров)
+    проходят через общий лимитер с интерактивным приоритетом и повторяются
+    после retry_after.
+    """
+
+    def __init__(self, limiter: TelegramRateLimiter):
+        self.limiter = limiter
+        self.log = logger("telegram-rate-limit")
+
+    async def __call__(self, make_request, bot: Bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if not isinstance(chat_id, int) or _limit_acquired.get():
+            return await make_request(bot, method)
+        while True:
+            await self.limiter.acquire(chat_id, Priority.INTERACTIVE)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                metrics.inc("telegram.retry_after")
+                self.log.warning(f"Flood control для чата {chat_id}: ждём {e.retry_after} с")
+                self.limiter.pause(chat_id, e.retry_after)
+
+
+class _SendJob:
+    def __init__(self, chat_id: int, text: str, priority: Priority, kwargs: dict):
+        self.chat_id = chat_id
+        self.text = text
+        self.priority = priority
+        self.kwargs = kwargs
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class TelegramSender:
+    """
+    Центральная очередь исходящих сообщений.
+    Сообщения отправляются воркерами с учётом лимитов, retry_after и приоритета;
+    send_message() возвращает future с результатом отправки.
+    """
+
+    def __init__(self, bot: Bot, limiter: Optional[TelegramRateLimiter] = None, workers: int = 4):
+        self.bot = bot
+        self.limiter = limiter or TelegramRateLimiter()
+        self.workers = workers
+        self.log = logger("telegram-sender")
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._tasks: list[asyncio.Task] = []
+        self._delayed: set[asyncio.Task] = set()
+        # Задания, чей future ещё не завершён: в очереди, в отложенном повторе или в отправке
+        self._pending: set[_SendJob] = set()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in [*self._tasks, *self._delayed]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Иначе ждущие send_message() (например, gather в планировщике) повиснут навсегда;
+        # исключение, а не cancel(): неотправленное должно считаться ошибкой отправки
+        for job in list(self._pending):
+            if not job.future.done():
+                job.future.set_exception(SenderStoppedError("Telegram sender stopped"))
+        self._pending.clear()
+
+    def send_message(
+        self, chat_id: int, text: str, priority: Priority = Priority.BULK, **kwargs: Any
+    ) -> asyncio.Future:
+        self.start()
+        job = _SendJob(chat_id, text, priority, kwargs)
+        self._pending.add(job)
+        job.future.add_done_callback(lambda _: self._pending.discard(job))
+        self._put(job)
+        return job.future
+
+    def _put(self, job: _SendJob) -> None:
+        # seq сохраняет порядок внутри одного приоритета
+        self._queue.put_nowait((job.priority, next(self._seq), job))
+        metrics.set_gauge("telegram.queue_depth", self.depth)
+
+    async def _requeue_later(self, job: _SendJob, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._put(job)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+            metrics.set_gauge("telegram.queue_depth", self.depth)
+            if job.future.cancelled():
+                continue
+            await self.limiter.acquire(job.chat_id, job.priority)
+            token = _limit_acquired.set(True)
+            try:
+                result = await self.bot.send_message(job.chat_id, job.text, **job.kwargs)
+            except TelegramRetryAfter as e:
+                metrics.inc("telegram.retry_after")
+                self.log.warning(f"Flood control для чата {job.chat_id}: ждём {e.retry_after} с")
+                self.limiter.pause(job.chat_id, e.retry_after)
+                self._put(job)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                job.attempts += 1
+                if job.attempts >= MAX_SEND_ATTEMPTS:
+                    metrics.inc("telegram.failed")
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                else:
+                    delayed = asyncio.create_task(self._requeue_later(job, RETRY_BACKOFF * job.attempts))
+                    self._delayed.add(delayed)
+                    delayed.add_done_callback(self._delayed.discard)
+            except Exception as e:
+                metrics.inc("telegram.failed")
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                metrics.inc("telegram.sent")
+                metrics.observe("telegram.send_latency", time.monotonic() - job.enqueued_at)
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                _limit_acquired.reset(token)
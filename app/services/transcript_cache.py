@@ -0,0 +1,80 @@
+import hashlib
+from io import BytesIO
+from typing import Optional
+from app.config import settings
+from app.db.session import get_session
+from app.db.repositories.transcript_repo import TranscriptRepository
+from app.utils.cache import TTLCache
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+
+def audio_hash(audio: BytesIO) -> str:
+    """sha256 содержимого буфера без копирования."""
+    return hashlib.sha256(audio.getbuffer()).hexdigest()
+
+
+class TranscriptCache:
+    """
+    Кэш распознанных голосовых в два уровня: LRU в памяти и таблица transcripts.
+    Ключи — file_unique_id Telegram (повтор и пересылка того же файла, проверяется
+    до скачивания) и sha256 аудио (то же содержимое в другом файле, после скачивания).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = settings.TRANSCRIPT_CACHE_SIZE,
+        ttl: float = settings.TRANSCRIPT_CACHE_TTL,
+    ):
+        # ("file", file_unique_id) | ("sha256", hash) -> текст
+        self._memory: TTLCache[tuple, str] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.log = logger("transcript-cache")
+
+    def _hit(self, level: str, text: str) -> str:
+        metrics.inc(f"transcript_cache.hit.{level}")
+        return text
+
+    async def get_by_file_id(self, file_unique_id: str) -> Optional[str]:
+        text = self._memory.get(("file", file_unique_id))
+        if text is not None:
+            return self._hit("memory", text)
+        async for session in get_session():
+            transcript = await TranscriptRepository(session).get_by_file_id(file_unique_id)
+        if transcript is None:
+            return None
+        self._remember(transcript.content_hash, file_unique_id, transcript.text)
+        return self._hit("db", transcript.text)
+
+    async def get_by_hash(self, content_hash: str, file_unique_id: Optional[str] = None) -> Optional[str]:
+        text = self._memory.get(("sha256", content_hash))
+        if text is None:
+            async for session in get_session():
+                transcript = await TranscriptRepository(session).get_by_hash(content_hash)
+            if transcript is None:
+                metrics.inc("transcript_cache.miss")
+                return None
+            text = transcript.text
+            level = "db"
+        else:
+            level = "memory"
+        if file_unique_id:
+            # Следующая копия этого файла найдётся ещё до скачивания
+            await self.put(content_hash, file_unique_id, text)
+        return self._hit(level, text)
+
+    async def put(self, content_hash: str, file_unique_id: Optional[str], text: str) -> None:
+        self._remember(content_hash, file_unique_id, text)
+        try:
+            async for session in get_session():
+                await TranscriptRepository(session).save(content_hash, file_unique_id, text)
+        except Exception as e:
+            # Кэш — оптимизация: ошибка записи не должна ломать обработку голосового
+            self.log.warning(f"Не удалось сохранить транскрипт {content_hash[:12]}: {e}")
+
+    def _remember(self, content_hash: str, file_unique_id: Optional[str], text: str) -> None:
+        self._memory.set(("sha256", content_hash), text)
+        if file_unique_id:
+            self._memory.set(("file", file_unique_id), text)
+
+
+transcript_cache = TranscriptCache()
@@ -1,19 +1,134 @@
-from typing import Literal
+import asyncio
+import importlib.util
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, Literal, Optional, Union
+from app.config import settings
 from app.utils.logger import logger
 
+# Модель локального распознавания; своя в каждом процессе пула
+_model = None
+_local_pool: Optional[ProcessPoolExecutor] = None
+# Свой пул потоков для блокирующего SDK AssemblyAI: не отнимает default executor у остального кода
+_api_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _init_local_worker(model_size: str, compute_type: str, cpu_threads: int) -> None:
+    """Инициализатор процесса пула: модель загружается один раз на процесс."""
+    global _model
+    from faster_whisper import WhisperModel
+    _model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+
+def _transcribe_local(data: bytes, language: str) -> str:
+    segments, _ = _model.transcribe(BytesIO(data), language=language)
+    return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+def _ping() -> bool:
+    return _model is not None
+
+
+def _get_local_pool() -> ProcessPoolExecutor:
+    global _local_pool
+    if _local_pool is None:
+        _local_pool = ProcessPoolExecutor(
+            max_workers=settings.TRANSCRIPTION_WORKERS,
+            # spawn: форк процесса с event loop и открытыми соединениями небезопасен
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_local_worker,
+            initargs=(settings.WHISPER_MODEL, settings.WHISPER_COMPUTE_TYPE, settings.WHISPER_CPU_THREADS),
+        )
+    return _local_pool
+
+
+def _get_api_pool() -> ThreadPoolExecutor:
+    global _api_pool
+    if _api_pool is None:
+        _api_pool = ThreadPoolExecutor(
+            max_workers=settings.TRANSCRIPTION_CONCURRENCY, thread_name_prefix="transcription"
+        )
+    return _api_pool
+
+
+async def _run_in_pool(pool: Executor, fn: Callable, *args: Any) -> Any:
+    """
+    Как run_in_executor, но отмена не отпускает вызывающего, пока вызов работает в пуле:
+    поток или процесс не прервать, и слот очереди распознавания должен оставаться
+    занятым, пока он действительно занят. Ещё не начатый вызов просто снимается.
+    """
+    future = pool.submit(fn, *args)
+    wrapped = asyncio.wrap_future(future)
+    try:
+        return await asyncio.shield(wrapped)
+    except asyncio.CancelledError:
+        if not future.cancel():
+            await asyncio.wait({wrapped})
+        raise
+
+
+def shutdown_transcription_pool() -> None:
+    global _local_pool, _api_pool
+    if _local_pool is not None:
+        _local_pool.shutdown(wait=False, cancel_futures=True)
+        _local_pool = None
+    if _api_pool is not None:
+        _api_pool.shutdown(wait=False, cancel_futures=True)
+        _api_pool = None
+
 
 class TranscriptionService:
-    def __init__(self, mode: Literal["local", "api"] = "local"):
-        self.mode = mode
-        # Здесь можно инициализировать клиента или модель
+    """
+    Распознавание речи:
+    - api — AssemblyAI (сетевой вызов SDK в потоке);
+    - local — faster-whisper на CPU в пуле процессов с прогретой моделью
+      (pip install ".[local]"), event loop не блокируется.
+    """
+
+    def __init__(self, mode: Optional[Literal["local", "api"]] = None):
+        self.mode = mode or settings.TRANSCRIPTION_MODE
+        self.language = settings.TRANSCRIPTION_LANGUAGE
         self.logger = logger("transcription-service")
+        if self.mode == "local" and importlib.util.find_spec("faster_whisper") is None:
+            raise RuntimeError('TRANSCRIPTION_MODE=local требует faster-whisper: pip install ".[local]"')
 
-    async def transcribe_audio(self, file_path: str) -> str:
+    async def warm_up(self) -> None:
+        """Поднимает процессы пула и загружает в них модель до первого голосового."""
+        if self.mode != "local":
+            return
+        loop = asyncio.get_running_loop()
+        pool = _get_local_pool()
         try:
-            self.logger.info(f"Transcribing audio file: {file_path}")
-            # TODO: Реализовать транскрибацию через Whisper/Ollama или API
-            # Вернуть распознанный текст
-            pass
+            await asyncio.gather(
+                *(loop.run_in_executor(pool, _ping) for _ in range(settings.TRANSCRIPTION_WORKERS))
+            )
         except Exception as e:
-            self.logger.exception(f"Transcription failed for {file_path}: {e}")
+            self.logger.exception(f"Не удалось загрузить модель распознавания: {e}")
+            return
+        self.logger.info(f"Модель {settings.WHISPER_MODEL} загружена, процессов: {settings.TRANSCRIPTION_WORKERS}")
+
+    async def transcribe_audio(self, audio: Union[BytesIO, bytes]) -> str:
+        try:
+            self.logger.info(f"Transcribing audio ({self.mode})")
+            if self.mode == "local":
+                return await self._transcribe_local(audio)
+            return await self._transcribe_api(audio)
+        except Exception as e:
+            self.logger.exception(f"Transcription failed ({self.mode}): {e}")
             raise
+
+    async def _transcribe_local(self, audio: Union[BytesIO, bytes]) -> str:
+        data = audio.getvalue() if isinstance(audio, BytesIO) else audio
+        return await _run_in_pool(_get_local_pool(), _transcribe_local, data, self.language)
+
+    async def _transcribe_api(self, audio: Union[BytesIO, bytes]) -> str:
+        import assemblyai as aai
+        aai.settings.api_key = settings.ai.ASSEMBLYAI_API_KEY
+        transcriber = aai.Transcriber()
+        config = aai.TranscriptionConfig(language_code=self.language, speech_model=aai.SpeechModel.best)
+        # SDK принимает файловый объект и отправляет его потоком — без временного файла
+        transcript = await _run_in_pool(_get_api_pool(), lambda: transcriber.transcribe(audio, config=config))
+        if transcript.status == aai.TranscriptStatus.error:
+            raise RuntimeError(f"Transcription failed: {transcript.error}")
+        return transcript.text or ""
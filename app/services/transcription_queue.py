@@ -0,0 +1,222 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+from app.config import settings
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+# Результат cancel()
+CANCELLED_QUEUED = "queued"
+CANCELLED_RUNNING = "running"
+
+# Не чаще одного обновления места в очереди на задачу (лимиты Telegram на правку сообщения)
+POSITION_UPDATE_INTERVAL = 3.0
+
+
+class QueueFullError(Exception):
+    """Очередь распознавания (общая или пользователя) заполнена."""
+
+
+class _Job:
+    __slots__ = ("key", "user_id", "run", "on_position", "position", "reported", "reported_at", "reporter")
+
+    def __init__(
+        self,
+        key: Hashable,
+        user_id: int,
+        run: Callable[[], Awaitable],
+        on_position: Optional[Callable[[int], Awaitable]] = None,
+        position: int = 0,
+    ):
+        self.key = key
+        self.user_id = user_id
+        self.run = run
+        self.on_position = on_position
+        # Текущее место и последнее отправленное в on_position
+        self.position = position
+        self.reported = position
+        self.reported_at = 0.0
+        self.reporter: Optional[asyncio.Task] = None
+
+    def stop_reporting(self) -> None:
+        if self.reporter is not None:
+            self.reporter.cancel()
+
+
+class TranscriptionQueue:
+    """
+    Ограниченная очередь задач распознавания с фиксированным числом воркеров.
+    - не больше max_size задач в ожидании и max_per_user у одного пользователя:
+      лишние отклоняются сразу (QueueFullError), а не копятся в памяти;
+    - пользователи обслуживаются по кругу: серия голосовых одного
+      не задерживает остальных дольше, чем на одну задачу;
+    - cancel() снимает задачу и из очереди, и во время выполнения; отменённая
+      задача держит слот воркера, пока не закончится её вызов в пуле потоков/процессов;
+    - ждущие задачи узнают своё место через on_position, когда очередь сдвигается
+      (не чаще POSITION_UPDATE_INTERVAL на задачу).
+    """
+
+    def __init__(
+        self,
+        concurrency: int = settings.TRANSCRIPTION_CONCURRENCY,
+        max_size: int = settings.TRANSCRIPTION_QUEUE_SIZE,
+        max_per_user: int = settings.TRANSCRIPTION_QUEUE_PER_USER,
+    ):
+        self.concurrency = concurrency
+        self.max_size = max_size
+        self.max_per_user = max_per_user
+        # user_id -> задачи пользователя; порядок ключей — очередь обхода по кругу
+        self._users: "OrderedDict[int, deque[_Job]]" = OrderedDict()
+        self._size = 0
+        self._running: Dict[Hashable, asyncio.Task] = {}
+        self._ready = asyncio.Event()
+        self._workers: list = []
+        self.log = logger("transcription-queue")
+
+    @property
+    def depth(self) -> int:
+        return self._size
+
+    def has_room(self, user_id: int) -> bool:
+        queued = len(self._users.get(user_id, ()))
+        return self._size < self.max_size and queued < self.max_per_user
+
+    def _order(self, extra_user_id: Optional[int] = None) -> List[Optional[_Job]]:
+        """
+        Ждущие задачи в том порядке, в каком их заберут воркеры: каждый круг
+        берёт по задаче у каждого пользователя. extra_user_id добавляет в конец
+        очереди пользователя ещё одну задачу (None в результате).
+        """
+        queues = [list(jobs) for jobs in self._users.values()]
+        if extra_user_id is not None:
+            if extra_user_id in self._users:
+                queues[list(self._users).index(extra_user_id)].append(None)
+            else:
+                queues.append([None])
+        order: List[Optional[_Job]] = []
+        for i in range(max(map(len, queues), default=0)):
+            order.extend(jobs[i] for jobs in queues if i < len(jobs))
+        return order
+
+    def _position(self, index: int) -> int:
+        # Свободные воркеры заберут первые задачи сразу
+        return max(index + 1 - (self.concurrency - len(self._running)), 0)
+
+    def estimate_position(self, user_id: int) -> int:
+        """Место новой задачи пользователя в очереди (0 — начнётся сразу)."""
+        order = self._order(extra_user_id=user_id)
+        return self._position(order.index(None))
+
+    def submit(
+        self,
+        key: Hashable,
+        user_id: int,
+        run: Callable[[], Awaitable],
+        on_position: Optional[Callable[[int], Awaitable]] = None,
+        position: int = 0,
+    ) -> None:
+        """
+        Ставит задачу в очередь; run — фабрика корутины, key — для cancel().
+        on_position получает новое место задачи, пока она ждёт; position — место,
+        которое пользователю уже показали.
+        """
+        if not self.has_room(user_id):
+            raise QueueFullError(f"Transcription queue is full (user {user_id})")
+        self._start()
+        self._users.setdefault(user_id, deque()).append(_Job(key, user_id, run, on_position, position))
+        self._size += 1
+        metrics.set_gauge("transcription.queue_depth", self._size)
+        self._report_positions()
+        self._ready.set()
+
+    def _report_positions(self) -> None:
+        for index, job in enumerate(self._order()):
+            position = self._position(index)
+            # 0 — задачу вот-вот заберёт воркер, об этом сообщит сама задача
+            if job.on_position is None or position == job.position or position == 0:
+                continue
+            job.position = position
+            if job.reporter is None or job.reporter.done():
+                job.reporter = asyncio.create_task(self._report(job))
+
+    async def _report(self, job: _Job) -> None:
+        loop = asyncio.get_running_loop()
+        while job.position != job.reported:
+            delay = job.reported_at + POSITION_UPDATE_INTERVAL - loop.time()
+            if delay > 0:
+                # За время ожидания место могло смениться ещё раз — отправим последнее
+                await asyncio.sleep(delay)
+                continue
+            job.reported, job.reported_at = job.position, loop.time()
+            try:
+                await job.on_position(job.reported)
+            except Exception as e:
+                self.log.warning(f"Не удалось обновить место в очереди {job.key}: {e!r}")
+
+    def cancel(self, key: Hashable) -> Optional[str]:
+        for user_id, jobs in self._users.items():
+            for job in jobs:
+                if job.key == key:
+                    jobs.remove(job)
+                    if not jobs:
+                        del self._users[user_id]
+                    self._size -= 1
+                    metrics.set_gauge("transcription.queue_depth", self._size)
+                    job.stop_reporting()
+                    self._report_positions()
+                    return CANCELLED_QUEUED
+        task = self._running.get(key)
+        # Повторная отмена уже отменяемой задачи ничего не меняет
+        if task is not None and not task.done() and not task.cancelling():
+            task.cancel()
+            return CANCELLED_RUNNING
+        return None
+
+    def _pop(self) -> Optional[_Job]:
+        if not self._users:
+            return None
+        user_id, jobs = next(iter(self._users.items()))
+        job = jobs.popleft()
+        # Пользователь уходит в конец круга
+        del self._users[user_id]
+        if jobs:
+            self._users[user_id] = jobs
+        self._size -= 1
+        metrics.set_gauge("transcription.queue_depth", self._size)
+        return job
+
+    def _start(self) -> None:
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def _worker(self) -> None:
+        while True:
+            job = self._pop()
+            if job is None:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            job.stop_reporting()
+            task = asyncio.create_task(job.run())
+            self._running[job.key] = task
+            self._report_positions()
+            try:
+                await asyncio.wait({task})
+                if not task.cancelled() and task.exception():
+                    self.log.error(f"Ошибка задачи распознавания {job.key}: {task.exception()!r}")
+            finally:
+                self._running.pop(job.key, None)
+
+    async def stop(self) -> None:
+        for jobs in self._users.values():
+            for job in jobs:
+                job.stop_reporting()
+        for worker in self._workers:
+            worker.cancel()
+        for task in self._running.values():
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._running.values(), return_exceptions=True)
+        self._workers = []
+
+
+transcription_queue = TranscriptionQueue()
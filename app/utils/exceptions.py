@@ -0,0 +1,77 @@
+from typing import Optional
+
+# reason из ответа Google, означающие превышение квоты/лимита запросов
+QUOTA_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded", "dailyLimitExceeded"}
+# Лимит на пользователя; остальные причины квоты считаются лимитом проекта
+USER_QUOTA_REASONS = {"userRateLimitExceeded"}
+
+
+class GoogleApiError(Exception):
+    """Ошибка ответа Google API (не 2xx)."""
+
+    # Класс ошибки для метрик google.<endpoint>.errors.<kind>
+    kind = "request"
+    retryable = False
+
+    def __init__(
+        self,
+        status: int,
+        message: str,
+        reason: Optional[str] = None,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(f"Google API {status}: {message}")
+        self.status = status
+        self.message = message
+        self.reason = reason
+        # Retry-After из ответа, секунд
+        self.retry_after = retry_after
+
+
+class GoogleAuthError(GoogleApiError):
+    """Токен отозван или нет прав: повтор не поможет, нужна повторная авторизация."""
+
+    kind = "auth"
+
+
+class GoogleQuotaError(GoogleApiError):
+    """Превышен лимит запросов пользователя или проекта: повторить позже."""
+
+    kind = "quota"
+    retryable = True
+
+    @property
+    def per_user(self) -> bool:
+        return self.reason in USER_QUOTA_REASONS
+
+
+class GoogleTransientError(GoogleApiError):
+    """5xx, таймаут или сетевая ошибка: повторить с backoff."""
+
+    kind = "transient"
+    retryable = True
+
+
+def google_api_error(
+    status: int,
+    message: str,
+    reason: Optional[str] = None,
+    retry_after: Optional[float] = None,
+) -> GoogleApiError:
+    """Классифицирует ответ Google: auth / quota / transient / прочие ошибки запроса."""
+    if status == 429 or (status == 403 and reason in QUOTA_REASONS):
+        return GoogleQuotaError(status, message, reason, retry_after)
+    if status in (401, 403):
+        return GoogleAuthError(status, message, reason, retry_after)
+    if status >= 500 or status == 408:
+        return GoogleTransientError(status, message, reason, retry_after)
+    return GoogleApiError(status, message, reason, retry_after)
+
+
+class FileTooLargeError(Exception):
+    """Скачиваемый файл больше допустимого размера."""
+
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"File is too large: {size} > {limit} bytes")
+        self.size = size
+        self.limit = limit
@@ -0,0 +1,56 @@
+import asyncio
+from io import BytesIO
+from typing import Optional
+import aiohttp
+from app.config import settings
+from app.utils.exceptions import FileTooLargeError
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Общая aiohttp-сессия процесса: пул соединений с keep-alive
+    переиспользуется всеми исходящими HTTP-вызовами.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_POOL_SIZE,
+            limit_per_host=settings.HTTP_POOL_SIZE_PER_HOST,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=settings.HTTP_TIMEOUT),
+        )
+    return _session
+
+
+async def close_http_session() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        # Даём соединениям закрыться до остановки event loop
+        await asyncio.sleep(0)
+    _session = None
+
+
+async def download_to_buffer(url: str, max_bytes: int, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> BytesIO:
+    """
+    Скачивает файл через общую сессию по частям в память.
+    Больше max_bytes — FileTooLargeError (по Content-Length сразу, иначе по ходу чтения).
+    """
+    async with get_http_session().get(url) as resp:
+        resp.raise_for_status()
+        if resp.content_length is not None and resp.content_length > max_bytes:
+            raise FileTooLargeError(resp.content_length, max_bytes)
+        buffer = BytesIO()
+        async for chunk in resp.content.iter_chunked(chunk_size):
+            if buffer.tell() + len(chunk) > max_bytes:
+                raise FileTooLargeError(buffer.tell() + len(chunk), max_bytes)
+            buffer.write(chunk)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict
+from app.utils.logger import logger
+
+
+class Timing:
+    """Счётчик длительностей: общее число, сумма, максимум и последние значения для перцентилей."""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._recent.append(seconds)
+
+    def percentile(self, p: float) -> float:
+        if not self._recent:
+            return 0.0
+        values = sorted(self._recent)
+        return values[min(int(len(values) * p), len(values) - 1)]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.max,
+        }
+
+
+class Metrics:
+    """Простой внутрипроцессный реестр метрик: счётчики, gauge-значения и тайминги."""
+
+    def __init__(self):
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._gauges: Dict[str, float] = {}
+        self._gauge_readers: Dict[str, Callable[[], float]] = {}
+        self._timings: Dict[str, Timing] = defaultdict(Timing)
+
+    def inc(self, name: str, value: int = 1) -> None:
+        self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self._gauges[name] = value
+
+    def register_gauge(self, name: str, read: Callable[[], float]) -> None:
+        """Gauge, значение которого читается в момент снимка."""
+        self._gauge_readers[name] = read
+
+    def observe(self, name: str, seconds: float) -> None:
+        self._timings[name].observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self._counters),
+            "gauges": {**self._gauges, **{name: read() for name, read in self._gauge_readers.items()}},
+            "timings": {name: t.snapshot() for name, t in self._timings.items()},
+        }
+
+
+metrics = Metrics()
+
+
+async def metrics_reporter(interval: float = 60.0) -> None:
+    """Периодически пишет снимок метрик в лог (для процессов без HTTP-эндпоинта)."""
+    log = logger("metrics")
+    while True:
+        await asyncio.sleep(interval)
+        log.info(f"Metrics: {metrics.snapshot()}")
@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Классический token bucket: rate токенов в секунду, не больше capacity.
+    pause() блокирует выдачу на заданное время (например, по retry_after).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """Сколько секунд ждать, пока станет доступно tokens токенов (0 — можно сейчас)."""
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(self.blocked_until - now, 0.0)
+        if self.tokens < tokens:
+            wait = max(wait, (tokens - self.tokens) / self.rate)
+        return wait
+
+    def consume(self, tokens: float = 1.0) -> None:
+        self._refill(time.monotonic())
+        self.tokens -= tokens
+
+    def pause(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    @property
+    def idle(self) -> bool:
+        """Ведро полное и не заблокировано — его состояние можно забыть."""
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            wait = self.delay(tokens)
+            if wait <= 0:
+                self.consume(tokens)
+                return
+            await asyncio.sleep(wait)
@@ -0,0 +1,65 @@
+import asyncio
+import datetime as dt
+from types import SimpleNamespace
+
+from google.oauth2.credentials import Credentials
+
+from app.services.calendar import BatchResult, GoogleCalendarService
+from app.services.calendar_sync import calendar_event_id, sync_tasks_batch
+
+
+class FakeBatchService(GoogleCalendarService):
+    """Сервис календаря, у которого batch отвечает заготовленными результатами."""
+
+    def __init__(self, *responses):
+        super().__init__(Credentials(token="token"), user_id=1)
+        self.responses = list(responses)
+        self.sent = []
+
+    async def batch(self, calls, batch_size=None, idempotent=True):
+        self.sent.append((calls, idempotent))
+        return self.responses.pop(0)
+
+
+def _task(**fields):
+    values = dict(
+        id=7,
+        description="Позвонить",
+        due_datetime=dt.datetime(2030, 1, 1, 12, tzinfo=dt.timezone.utc),
+        duration=30,
+        remind_at=10,
+        google_event_id=calendar_event_id(7),
+    )
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+def test_event_deleted_in_google_is_recreated_with_new_id():
+    service = FakeBatchService(
+        [BatchResult(410, {"error": {"message": "Resource has been deleted"}})],
+        [BatchResult(200, {"id": "googleassignedid"})],
+    )
+
+    event_ids, errors = asyncio.run(sync_tasks_batch(service, [_task()], {}))
+
+    assert errors == {}
+    assert event_ids == {7: "googleassignedid"}
+    (patch,), _ = service.sent[0]
+    assert patch.method == "PATCH" and patch.url.endswith(calendar_event_id(7))
+    (insert,), idempotent = service.sent[1]
+    # Id удалённого события повторно не используется
+    assert insert.method == "POST" and "id" not in insert.body
+    assert insert.body["summary"] == "Позвонить"
+    assert idempotent is False
+
+
+def test_failed_recreate_is_reported_as_error():
+    service = FakeBatchService(
+        [BatchResult(404, {"error": {"message": "Not Found"}})],
+        [BatchResult(500, {"error": {"message": "Backend Error"}})],
+    )
+
+    event_ids, errors = asyncio.run(sync_tasks_batch(service, [_task()], {}))
+
+    assert event_ids == {}
+    assert errors[7].status == 500